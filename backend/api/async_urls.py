@@ -0,0 +1,37 @@
+from django.urls import URLPattern, URLResolver
+
+from api import urls
+from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
+                       get_users_me)
+from core.asgi import async_read_view
+
+app_name = urls.app_name
+ASYNC_VIEWSETS = (IngredientViewSet, RecipeViewSet, TagViewSet)
+
+
+def is_async_read(callback):
+    if callback is get_users_me:
+        return True
+    actions = getattr(callback, "actions", None) or {}
+    return getattr(callback, "cls", None) in ASYNC_VIEWSETS and actions.get("get") in ("list", "retrieve")
+
+
+def get_async_patterns(patterns):
+    """Copy of ``patterns`` with the hot read views made async."""
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            pattern = URLResolver(
+                pattern.pattern,
+                get_async_patterns(pattern.url_patterns),
+                pattern.default_kwargs,
+                pattern.app_name,
+                pattern.namespace,
+            )
+        elif is_async_read(pattern.callback):
+            pattern = URLPattern(pattern.pattern, async_read_view(pattern.callback), pattern.default_args, pattern.name)
+        result.append(pattern)
+    return result
+
+
+urlpatterns = get_async_patterns(urls.urlpatterns)
@@ -0,0 +1,66 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.caching import is_cache_in_database, is_cache_shared
+from core.metrics import Counter, collect, register
+
+TOKEN_CACHE_TIMEOUT = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 5 * 60)
+
+token_cache_lookups = register(Counter("auth_token_cache_lookups_total", "Поиски токена в кеше", label="result"))
+
+
+def get_token_cache_stats() -> dict:
+    """Hits and misses of the token cache, summed over the workers by ``collect``."""
+    series = collect().get(token_cache_lookups.name, {}).get("series", {})
+    hits, misses = series.get("hit", 0), series.get("miss", 0)
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0}
+
+
+def get_token_cache_key(key):
+    # Raw tokens are credentials, they should not end up in the cache keys.
+    return f"auth-token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def get_user_cache_key(user_id):
+    return f"auth-token-user:{user_id}"
+
+
+def invalidate_token(key):
+    cache.delete(get_token_cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    user_key = get_user_cache_key(user_id)
+    token_key = cache.get(user_key)
+    if token_key is not None:
+        cache.delete_many([token_key, user_key])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that keeps the token owner in the cache.
+
+    Entries are dropped when the token is deleted or the user is saved or
+    deleted, see ``foods.signals``; the timeout bounds anything else. With a
+    per-process cache the other workers would keep accepting a revoked
+    token, and with ``DatabaseCache`` a hit costs the same single query as
+    the token lookup, so in both cases every request goes to the database.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_cache_shared() or is_cache_in_database():
+            return super().authenticate_credentials(key)
+        cache_key = get_token_cache_key(key)
+        user = cache.get(cache_key)
+        token_cache_lookups.inc(1, "miss" if user is None else "hit")
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set_many({cache_key: user, get_user_cache_key(user.pk): cache_key}, TOKEN_CACHE_TIMEOUT)
+            return user, token
+        if not user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,135 @@
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.paginators import CachedCountPaginator
+
+
+class KeysetPagination(PageNumberPagination):
+    """Page number pagination with an opt-in keyset mode.
+
+    Without ``cursor`` in the query string the usual page number response is
+    returned, with the total count cached for a short time. With ``?cursor=``
+    pages are fetched with ``WHERE (ordering) < (last row)`` instead of an
+    OFFSET, so any page costs the same as the first one.
+
+    A view sets ``exact_count`` when the rows follow the user's own toggles
+    (favourites, cart, subscriptions): the user expects the count to change
+    right after a toggle, so it is not cached.
+    """
+
+    django_paginator_class = CachedCountPaginator
+    page_size_query_param = "limit"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering = ("-id",)
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            if getattr(view, "exact_count", False):
+                self.django_paginator_class = Paginator
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+        ordering = [self.reverse_field(field) for field in self.ordering] if reverse else list(self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, values))
+        rows = list(queryset.order_by(*ordering)[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.page_rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data})
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.get_cursor_link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.get_cursor_link(self.page_rows[0], reverse=True)
+
+    def get_cursor_link(self, row, reverse):
+        names = [field.lstrip("-") for field in self.ordering]
+        # Rows are model instances or .values() dicts.
+        values = [row[name] for name in names] if isinstance(row, dict) else [getattr(row, name) for name in names]
+        payload = json.dumps({"v": [str(value) for value in values], "r": reverse})
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            values = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, payload["v"])
+            ]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return values, bool(payload.get("r"))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def get_keyset_filter(ordering, values):
+        condition = Q()
+        for position, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = f"{name}__lt" if field.startswith("-") else f"{name}__gt"
+            equal = {ordering[index].lstrip("-"): values[index] for index in range(position)}
+            condition |= Q(**equal, **{lookup: values[position]})
+        return condition
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Курсор для постраничного вывода без OFFSET.",
+                "schema": {"type": "string"},
+            }
+        )
+        return parameters
+
+
+class RecipePagination(KeysetPagination):
+    ordering = ("-pub_date", "-id")
+
+
+class UserPagination(KeysetPagination):
+    ordering = ("id",)
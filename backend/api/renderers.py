@@ -0,0 +1,80 @@
+import time
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from core.request_metrics import record_render
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` on orjson, with the same output for API data.
+
+    The stdlib encoder is used without orjson, for indented output (the
+    browsable API, ``; indent=``) and for anything orjson refuses to encode.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return self.encode(data, accepted_media_type, renderer_context)
+        finally:
+            record_render(time.perf_counter() - started)
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Dates go through the DRF encoder, it formats them differently.
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does, to keep the output a JavaScript subset.
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class ExportRenderer(BaseRenderer):
+    """Renderer that lets ``?format=`` select a file export.
+
+    The export itself is built by the view, the renderer is only used for
+    error responses, which are written as plain ``key: value`` lines.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, dict):
+            data = "\n".join(f"{key}: {value}" for key, value in data.items())
+        return str(data).encode(self.charset)
+
+
+class PDFRenderer(ExportRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class PlainTextRenderer(ExportRenderer):
+    media_type = "text/plain"
+    format = "txt"
@@ -0,0 +1,122 @@
+"""Serializer-free output of ``GetRecipesSerializer`` for list and retrieve.
+
+Serializing a page runs a serializer with nested serializers and fields for
+every recipe, author, tag and ingredient on it. ``RecipeRepresentation``
+builds the same dicts from ``.values()`` rows: recipes with their authors in
+one query, tags and ingredients in one query each. The plain fields are
+planned once from the serializers themselves, the method fields are
+computed here. ``check_recipe_parity`` holds the two outputs byte for byte
+equal; writes keep using the serializers.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import (CustomUserSerializer, GetRecipesSerializer,
+                             IngredientRecipeSerializer, TagSerializer)
+from core.images import build_variant_urls
+from core.relations import get_user_relations
+from foods.models import IngredientRecipe, Recipe
+
+
+def get_field_plan(serializer_class, prefix="", computed=()):
+    """``[(key, column)]`` in output order, ``column`` is None for ``computed`` keys.
+
+    Plain fields are emitted as ``.values()`` returns them, which matches
+    what their ``to_representation`` gives for the column types in use.
+    """
+    plan = []
+    for key, field in serializer_class().fields.items():
+        if key in computed:
+            plan.append((key, None))
+            continue
+        if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+            raise ImproperlyConfigured(f"{serializer_class.__name__}.{key}: поле не описано в быстром пути")
+        plan.append((key, prefix + "__".join(field.source_attrs)))
+    return plan
+
+
+class RecipeRepresentation:
+    recipe_computed = (
+        "author",
+        "image",
+        "image_variants",
+        "tags",
+        "ingredients",
+        "is_favorited",
+        "is_in_shopping_cart",
+    )
+
+    def __init__(self):
+        self.plans = None
+
+    def get_plans(self):
+        # Built on first use, the serializers need the app registry.
+        if self.plans is None:
+            recipe = get_field_plan(GetRecipesSerializer, computed=self.recipe_computed)
+            author = get_field_plan(CustomUserSerializer, "author__", computed=("is_subscribed",))
+            columns = {column for _, column in recipe + author if column}
+            self.plans = {
+                "recipe": recipe,
+                "author": author,
+                "tag": get_field_plan(TagSerializer, "tag__"),
+                "ingredient": get_field_plan(IngredientRecipeSerializer),
+                # pub_date is read by the keyset pagination.
+                "columns": sorted(columns | {"id", "author__id", "image", "image_variants", "pub_date"}),
+            }
+        return self.plans
+
+    def get_rows(self, queryset):
+        return queryset.prefetch_related(None).values(*self.get_plans()["columns"])
+
+    def get_related(self, queryset, plan):
+        related = {}
+        for row in queryset.values("recipe_id", *(column for _, column in plan)):
+            related.setdefault(row["recipe_id"], []).append({key: row[column] for key, column in plan})
+        return related
+
+    def represent(self, rows, request) -> list:
+        plans = self.get_plans()
+        rows = list(rows)
+        if not rows:
+            return []
+        ids = [row["id"] for row in rows]
+        tags = self.get_related(Recipe.tags.through.objects.filter(recipe_id__in=ids).order_by("tag_id"), plans["tag"])
+        ingredients = self.get_related(
+            IngredientRecipe.objects.filter(recipe_id__in=ids).order_by("id"), plans["ingredient"]
+        )
+        relations = get_user_relations(request) if request.user.is_authenticated else None
+        storage = Recipe._meta.get_field("image").storage
+        recipes = []
+        for row in rows:
+            recipe_id = row["id"]
+            is_subscribed = relations is not None and row["author__id"] in relations["subscriptions"]
+            computed = {
+                "author": {key: row[column] if column else is_subscribed for key, column in plans["author"]},
+                "image": request.build_absolute_uri(storage.url(row["image"])),
+                "image_variants": build_variant_urls(storage, row["image_variants"], request),
+                "tags": tags.get(recipe_id, []),
+                "ingredients": ingredients.get(recipe_id, []),
+                "is_favorited": relations is not None and recipe_id in relations["favorites"],
+                "is_in_shopping_cart": relations is not None and recipe_id in relations["cart"],
+            }
+            recipes.append({key: row[column] if column else computed[key] for key, column in plans["recipe"]})
+        return recipes
+
+
+recipe_representation = RecipeRepresentation()
+
+
+def check_recipe_parity(queryset, request) -> list:
+    """Ids of the recipes in ``queryset`` rendered differently by the two paths."""
+    renderer = JSONRenderer()
+    recipes = list(queryset)
+    expected = GetRecipesSerializer(recipes, many=True, context={"request": request}).data
+    actual = recipe_representation.represent(recipe_representation.get_rows(queryset), request)
+    if len(expected) != len(actual):
+        return [recipe.id for recipe in recipes]
+    return [
+        recipe.id
+        for recipe, serialized, represented in zip(recipes, expected, actual)
+        if renderer.render(serialized) != renderer.render(represented)
+    ]
@@ -5,8 +5,10 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.serializers import ModelSerializer, Serializer
 from rest_framework.validators import UniqueValidator
 
+from core.images import get_variant_urls
+from core.relations import get_user_relations
 from foods.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                          ShoppingCart, Tag, User)
+                          ShoppingCart, ShoppingListItem, Tag, User)
 
 
 class CustomAuthTokenSerializer(ModelSerializer):
@@ -40,9 +42,9 @@ class CustomUserSerializer(ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        if self.context["request"].user.is_authenticated:
-            user = self.context["request"].user
-            return user.subscriber.filter(author=obj).exists()
+        request = self.context["request"]
+        if request.user.is_authenticated:
+            return obj.id in get_user_relations(request)["subscriptions"]
         return False
 
 
@@ -107,19 +109,27 @@ class IngredientSerializer(ModelSerializer):
 
 
 class IngredientRecipeSerializer(ModelSerializer):
-    id = serializers.SlugRelatedField(read_only=True, slug_field="id", source="ingredients")
-    name = serializers.SlugRelatedField(read_only=True, slug_field="name", source="ingredients")
-    measurement_unit = serializers.SlugRelatedField(read_only=True, slug_field="measurement_unit", source="ingredients")
+    id = serializers.ReadOnlyField(source="ingredients.id")
+    name = serializers.ReadOnlyField(source="ingredients.name")
+    measurement_unit = serializers.ReadOnlyField(source="ingredients.measurement_unit")
 
     class Meta:
         model = IngredientRecipe
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+class ShoppingListItemSerializer(ModelSerializer):
+    id = serializers.ReadOnlyField(source="ingredient.id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(source="ingredient.measurement_unit")
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ("id", "name", "measurement_unit", "amount")
+
+
 class CreateIngredientRecipeSerializer(ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-    )
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientRecipe
@@ -155,6 +165,15 @@ class SetRecipeSerializer(BaseRecipeSerializer):
             "ingredients",
         )
 
+    def validate_ingredients(self, value):
+        ingredients = Ingredient.objects.in_bulk({item["id"] for item in value})
+        for item in value:
+            if item["id"] not in ingredients:
+                message = serializers.PrimaryKeyRelatedField.default_error_messages["does_not_exist"]
+                raise serializers.ValidationError(str(message).format(pk_value=item["id"]))
+            item["id"] = ingredients[item["id"]]
+        return value
+
     def validate(self, data):
         if self.context["request"].method == "POST" and not data.get('image'):
             raise serializers.ValidationError(
@@ -164,6 +183,7 @@ class SetRecipeSerializer(BaseRecipeSerializer):
 
 class GetRecipesSerializer(BaseRecipeSerializer):
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientRecipeSerializer(many=True)
     tags = TagSerializer(many=True)
@@ -177,6 +197,7 @@ class GetRecipesSerializer(BaseRecipeSerializer):
             "author",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
             "tags",
@@ -190,16 +211,19 @@ class GetRecipesSerializer(BaseRecipeSerializer):
         image_url = obj.image.url
         return request.build_absolute_uri(image_url)
 
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj, self.context.get("request"))
+
     def get_is_favorited(self, obj):
-        if self.context["request"].user.is_authenticated:
-            user = self.context["request"].user
-            return user.voter.filter(recipe=obj).exists()
+        request = self.context["request"]
+        if request.user.is_authenticated:
+            return obj.id in get_user_relations(request)["favorites"]
         return False
 
     def get_is_in_shopping_cart(self, obj):
-        if self.context["request"].user.is_authenticated:
-            user = self.context["request"].user
-            return user.basket_owner.filter(recipe=obj).exists()
+        request = self.context["request"]
+        if request.user.is_authenticated:
+            return obj.id in get_user_relations(request)["cart"]
         return False
 
 
@@ -207,6 +231,7 @@ class GeneralSerializer(ModelSerializer):
     id = serializers.SlugRelatedField(slug_field="id", source="recipe", read_only=True)
     name = serializers.SlugRelatedField(slug_field="name", source="recipe", read_only=True)
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     cooking_time = serializers.SlugRelatedField(slug_field="cooking_time", source="recipe", read_only=True)
 
     def get_image(self, obj):
@@ -214,48 +239,24 @@ class GeneralSerializer(ModelSerializer):
         image_url = obj.recipe.image.url
         return request.build_absolute_uri(image_url)
 
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj.recipe, self.context.get("request"))
+
 
 class ShoppingCartSerializer(GeneralSerializer):
     class Meta:
         model = ShoppingCart
-        fields = ("id", "name", "image", "cooking_time")
-
-    def validate(self, data):
-        if self.context["request"].method == "POST":
-            user = self.context["request"].user
-            recipe_id = self.context["request"].data["id"]
-            recipe = get_object_or_404(Recipe, id=recipe_id)
-            if recipe.shopping_cart.filter(user=user).exists():
-                raise serializers.ValidationError(["Рецепт уже есть в списке покупок"])
-        return data
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
 
 
 class FavoriteSerializer(GeneralSerializer):
     class Meta:
         model = Favorite
-        fields = ("id", "name", "image", "cooking_time")
-
-    def validate(self, data):
-        if self.context["request"].method == "POST":
-            user = self.context["request"].user
-            recipe_id = self.context["request"].data["id"]
-            recipe = get_object_or_404(Recipe, id=recipe_id)
-            if recipe.favorite.filter(user=user).exists():
-                raise serializers.ValidationError(["Рецепт уже есть в избранном"])
-        return data
-
-
-class LimitedListSerializer(serializers.ListSerializer):
-    def to_representation(self, data):
-        limit = self.context["request"].query_params.get("recipes_limit")
-        if limit:
-            data = data.all()[: int(limit)]
-        return super(LimitedListSerializer, self).to_representation(data)
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
 
 
 class SubscribeRecipeSerializer(ModelSerializer):
     class Meta:
-        list_serializer_class = LimitedListSerializer
         model = Recipe
         fields = ("id", "name", "image", "cooking_time")
 
@@ -265,7 +266,7 @@ class SubscriptionSerializer(CustomUserSerializer):
     username = serializers.StringRelatedField()
     first_name = serializers.StringRelatedField()
     last_name = serializers.StringRelatedField()
-    recipes = SubscribeRecipeSerializer(read_only=True, many=True)
+    recipes = SubscribeRecipeSerializer(source="feed_recipes", read_only=True, many=True)
 
     class Meta:
         model = User
@@ -279,14 +280,3 @@ class SubscriptionSerializer(CustomUserSerializer):
             "recipes",
             "recipes_count",
         )
-
-    def validate(self, data):
-        if self.context["request"].method == "POST":
-            user = self.context["request"].user
-            author_id = self.context["request"].data["author_id"]
-            author = get_object_or_404(User, id=author_id)
-            if user == author:
-                raise serializers.ValidationError(["Нельзя подписаться на самого себя"])
-            if author.subscribed.filter(user=user).exists():
-                raise serializers.ValidationError(["Вы уже подписаны на этого автора"])
-        return data
@@ -3,8 +3,9 @@ from rest_framework.routers import DefaultRouter
 
 from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
                        UserViewSet, del_token, download_shopping_cart,
-                       favorite, get_token, get_users_me, set_password,
-                       shopping_cart)
+                       favorite, get_metrics, get_token, get_token_stats,
+                       get_users_me, set_password, shopping_cart,
+                       shopping_list)
 
 app_name = "api"
 router = DefaultRouter()
@@ -19,7 +20,10 @@ urlpatterns = [
     path("recipes/<int:recipe_id>/favorite/", favorite),
     path("recipes/<int:recipe_id>/shopping_cart/", shopping_cart),
     path("recipes/download_shopping_cart/", download_shopping_cart),
+    path("recipes/shopping_list/", shopping_list),
     path("", include(router.urls)),
     path("auth/token/login/", get_token),
     path("auth/token/logout/", del_token),
+    path("auth/token/stats/", get_token_stats),
+    path("_metrics/", get_metrics),
 ]
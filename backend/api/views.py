@@ -1,51 +1,164 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
+from django.db import transaction
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import filters, permissions, status
 from rest_framework.authtoken.models import Token
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       renderer_classes)
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from api.authentication import get_token_cache_stats
+from api.pagination import RecipePagination, UserPagination
 from api.permissions import (NicePerson, NicePersonOrReadOnly,
                              PostOnlyOrAuthenticated)
+from api.renderers import (CSVRenderer, FastJSONRenderer, PDFRenderer,
+                           PlainTextRenderer)
+from api.representations import recipe_representation
 from api.serializers import (CreateUserSerializer, CustomAuthTokenSerializer,
                              CustomUserSerializer, FavoriteSerializer,
                              GetRecipesSerializer, IngredientSerializer,
                              SetPasswordSerializer, SetRecipeSerializer,
-                             ShoppingCartSerializer, SubscriptionSerializer,
-                             TagSerializer)
+                             ShoppingCartSerializer,
+                             ShoppingListItemSerializer,
+                             SubscriptionSerializer, TagSerializer)
+from core.catalogue import get_catalogue_version
+from core.exports import STREAMS, get_shopping_cart_stream
+from core.ingredient_index import SEARCH_LIMIT, ingredient_index
+from core.metrics import collect, to_prometheus_text
 from core.pdf_engine import get_shopping_cart_pdf
+from core.relations import add_relation, remove_relation
+from core.replica import has_replica, is_pinned, read_from_replica
+from core.search import search_recipes
+from core.shopping_list import (add_to_shopping_lists, is_carted,
+                                subtract_from_shopping_lists)
 from foods.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                          ShoppingCart, Subscription, Tag)
+                          ShoppingCart, ShoppingListItem, Subscription, Tag)
 
 User = get_user_model()
 
+CATALOGUE_MAX_AGE = getattr(settings, "CATALOGUE_MAX_AGE", 0)
+
 
 class CustomSearchFilter(filters.SearchFilter):
     search_param = "name"
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class ReplicaReadMixin:
+    """Run the queries of safe requests on the read replica, if there is one."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            has_replica()
+            and request.method in permissions.SAFE_METHODS
+            and not (request.user.is_authenticated and is_pinned(request.user.pk))
+        ):
+            self.replica_token = read_from_replica.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.replica_token is not None:
+                read_from_replica.reset(self.replica_token)
+
+
+class CatalogueCacheMixin:
+    """Conditional GET for the tag and ingredient catalogues.
+
+    The ETag is derived from the catalogue version, so a matching
+    If-None-Match is answered with 304 after reading only the version row.
+    Put it before ``ReplicaReadMixin``: the version is then read from the
+    same database as the body.
+    """
+
+    def get_etag(self, request):
+        return f'"{self.basename}-{request.accepted_renderer.format}-{self.catalogue_version}"'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.catalogue_version = None
+        if request.method in permissions.SAFE_METHODS:
+            self.catalogue_version = get_catalogue_version()
+            self.etag = self.get_etag(request)
+
+    def is_not_modified(self, request):
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if not self.etag or not if_none_match:
+            return False
+        # Weak comparison, compression turns the ETag into a weak one.
+        etags = {etag[2:] if etag.startswith("W/") else etag for etag in parse_etags(if_none_match)}
+        return "*" in etags or self.etag in etags
+
+    def list(self, request, *args, **kwargs):
+        if self.is_not_modified(request):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_not_modified(request):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "etag", None) and response.status_code in (200, 304):
+            response["ETag"] = self.etag
+            patch_cache_control(response, public=True, max_age=CATALOGUE_MAX_AGE, must_revalidate=True)
+            patch_vary_headers(response, ["Accept"])
+        return response
+
+
+class TagViewSet(CatalogueCacheMixin, ReplicaReadMixin, ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     pagination_class = None
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogueCacheMixin, ReplicaReadMixin, ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     pagination_class = None
     filter_backends = [CustomSearchFilter]
     search_fields = ["^name"]
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(CustomSearchFilter.search_param)
+        if name is None or self.is_not_modified(request):
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get("limit", "")
+        limit = int(limit) if limit.isdigit() else SEARCH_LIMIT
+        return Response(ingredient_index.search(name, limit, version=self.catalogue_version))
+
+
+def get_recipes_queryset():
+    return (
+        Recipe.objects.select_related("author")
+        .prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.order_by("id")),
+            Prefetch("ingredients", queryset=IngredientRecipe.objects.select_related("ingredients").order_by("id")),
+        )
+        .order_by("-pub_date", "-id")
+    )
+
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, ModelViewSet):
     serializer_class = GetRecipesSerializer
     permission_classes = [NicePersonOrReadOnly]
+    pagination_class = RecipePagination
 
     def get_queryset(self):
-        queryset = Recipe.objects.prefetch_related("author", "tags")
+        user = self.request.user
+        queryset = get_recipes_queryset()
         params = self.request.query_params
         if self.request.method == "GET":
             tags = params.getlist("tags")
@@ -54,30 +167,72 @@ class RecipeViewSet(ModelViewSet):
             if params.get("author"):
                 author = get_object_or_404(User, id=params.get("author"))
                 queryset = queryset.filter(author=author)
+            if params.get("search"):
+                queryset = search_recipes(queryset, params.get("search"))
 
-            if self.request.user.is_authenticated:
+            if user.is_authenticated:
                 if params.get("is_favorited"):
-                    favorit_obj = Favorite.objects.filter(user=self.request.user)
-                    queryset = queryset.filter(id__in=favorit_obj.values("recipe_id"))
+                    queryset = queryset.filter(id__in=user.voter.values("recipe_id"))
+                    self.exact_count = True
                 if params.get("is_in_shopping_cart"):
-                    s_cart_obj = ShoppingCart.objects.filter(user=self.request.user)
-                    queryset = queryset.filter(id__in=s_cart_obj.values("recipe_id"))
+                    queryset = queryset.filter(id__in=user.basket_owner.values("recipe_id"))
+                    self.exact_count = True
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        rows = recipe_representation.get_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(recipe_representation.represent(page, request))
+        return Response(recipe_representation.represent(rows, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        row = get_object_or_404(recipe_representation.get_rows(self.get_queryset()), pk=kwargs["pk"])
+        return Response(recipe_representation.represent([row], request)[0])
+
+    def save_ingredients(self, recipe, ingredients_data, created=False):
+        amounts = {}
+        for ingredient_data in ingredients_data:
+            ingredient_id = ingredient_data["id"].id
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + ingredient_data["amount"]
+
+        stale, changed, existing = [], [], set()
+        if not created:
+            for row in IngredientRecipe.objects.filter(recipe=recipe):
+                if row.ingredients_id not in amounts or row.ingredients_id in existing:
+                    stale.append(row.id)
+                    continue
+                existing.add(row.ingredients_id)
+                if row.amount != amounts[row.ingredients_id]:
+                    row.amount = amounts[row.ingredients_id]
+                    changed.append(row)
+        added = [
+            IngredientRecipe(recipe=recipe, ingredients_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        # Shopping lists hold the sums of carted recipes, swap the old amounts for the new ones.
+        carted = not created and (stale or changed or added) and is_carted(recipe.id)
+        if carted:
+            subtract_from_shopping_lists(recipe.id)
+        if stale:
+            IngredientRecipe.objects.filter(id__in=stale).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ["amount"])
+        IngredientRecipe.objects.bulk_create(added)
+        if carted:
+            add_to_shopping_lists(recipe.id)
+
     def create(self, request, *args, **kwargs):
         serializer = SetRecipeSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
             ingredients_data = serializer.validated_data.pop("ingredients")
             tags_data = serializer.validated_data.pop("tags")
-            recipe = Recipe.objects.create(author=request.user, **serializer.validated_data)
-            for ingredient_data in ingredients_data:
-                IngredientRecipe.objects.create(
-                    recipe=recipe,
-                    ingredients=ingredient_data["id"],
-                    amount=ingredient_data["amount"],
-                )
-            for tag_data in tags_data:
-                recipe.tags.add(tag_data.id)
+            with transaction.atomic():
+                recipe = Recipe.objects.create(author=request.user, **serializer.validated_data)
+                self.save_ingredients(recipe, ingredients_data, created=True)
+                recipe.tags.add(*tags_data)
+            recipe = self.get_queryset().get(id=recipe.id)
             serializer = GetRecipesSerializer(instance=recipe, context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -87,23 +242,15 @@ class RecipeViewSet(ModelViewSet):
         if serializer.is_valid():
             ingredients_data = serializer.validated_data.pop("ingredients")
             tags_data = serializer.validated_data.pop("tags")
-            recipe = get_object_or_404(Recipe, id=kwargs["pk"])
-            self.check_object_permissions(self.request, recipe)
-            Recipe.objects.filter(id=recipe.id).update(**serializer.validated_data)
-            recipe = Recipe.objects.get(id=recipe.id)
-            if serializer.validated_data.get("image"):
-                recipe.image = serializer.validated_data["image"]
-            recipe.save()
-            IngredientRecipe.objects.filter(recipe=recipe).delete()
-            for ingredient_data in ingredients_data:
-                IngredientRecipe.objects.create(
-                    recipe=recipe,
-                    ingredients=ingredient_data["id"],
-                    amount=ingredient_data["amount"],
-                )
-            recipe.tags.through.objects.filter(recipe=recipe).delete()
-            for tag_data in tags_data:
-                recipe.tags.add(tag_data.id)
+            with transaction.atomic():
+                recipe = get_object_or_404(Recipe.objects.select_for_update(), id=kwargs["pk"])
+                self.check_object_permissions(self.request, recipe)
+                for field, value in serializer.validated_data.items():
+                    setattr(recipe, field, value)
+                recipe.save()
+                self.save_ingredients(recipe, ingredients_data)
+                recipe.tags.set(tags_data)
+            recipe = self.get_queryset().get(id=recipe.id)
             serializer = GetRecipesSerializer(instance=recipe, context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -111,13 +258,13 @@ class RecipeViewSet(ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         recipe = get_object_or_404(Recipe, id=kwargs["pk"])
         self.check_object_permissions(self.request, recipe)
-        IngredientRecipe.objects.filter(recipe=recipe).delete()
         recipe.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class UserViewSet(ModelViewSet):
-    queryset = User.objects.all()
+class UserViewSet(ReplicaReadMixin, ModelViewSet):
+    queryset = User.objects.order_by("id")
+    pagination_class = UserPagination
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -130,16 +277,52 @@ class UserViewSet(ModelViewSet):
         permission_classes=[PostOnlyOrAuthenticated],
     )
     def subscriptions(self, request):
-        subscriders = User.objects.filter(id__in=request.user.subscriber.all().values("author_id"))
+        subscriders = self.get_subscriptions()
+        self.exact_count = True
 
         page = self.paginate_queryset(subscriders)
         if page is not None:
-            serializer = SubscriptionSerializer(page, many=True, context={"request": request})
+            serializer = SubscriptionSerializer(self.add_recipes(page), many=True, context={"request": request})
             return self.get_paginated_response(serializer.data)
 
-        serializer = SubscriptionSerializer(subscriders, many=True, context={"request": request})
+        serializer = SubscriptionSerializer(self.add_recipes(subscriders), many=True, context={"request": request})
         return Response(serializer.data)
 
+    def get_subscriptions(self):
+        return User.objects.filter(id__in=self.request.user.subscriber.values("author_id")).order_by("id")
+
+    def add_recipes(self, authors):
+        """Attach the latest recipes of every author as ``feed_recipes``.
+
+        All recipes are fetched in one query. With ``recipes_limit`` they are
+        ranked per author with ROW_NUMBER() and cut in the database.
+        """
+        authors = list(authors)
+        recipes = Recipe.objects.filter(author__in=authors).only("id", "name", "image", "cooking_time", "author")
+        limit = self.request.query_params.get("recipes_limit", "")
+        if limit.isdigit():
+            ranked = recipes.annotate(
+                feed_rank=Window(
+                    expression=RowNumber(),
+                    partition_by=F("author"),
+                    order_by=[F("pub_date").desc(), F("id").desc()],
+                )
+            )
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f"SELECT * FROM ({sql}) ranked WHERE feed_rank <= %s ORDER BY feed_rank",
+                (*params, int(limit)),
+            )
+        else:
+            recipes = recipes.order_by("-pub_date", "-id")
+
+        feed = {}
+        for recipe in recipes:
+            feed.setdefault(recipe.author_id, []).append(recipe)
+        for author in authors:
+            author.feed_recipes = feed.get(author.id, [])
+        return authors
+
     @action(
         detail=True,
         methods=["post", "delete"],
@@ -147,18 +330,25 @@ class UserViewSet(ModelViewSet):
     )
     def subscribe(self, request, pk=None):
         user = request.user
+        if not str(pk).isdigit():
+            raise NotFound
         author = get_object_or_404(User, id=pk)
-        request.data["author_id"] = pk
-        serializer = SubscriptionSerializer(data=request.data, context={"request": request})
-        if request.method == "POST" and serializer.is_valid():
-            Subscription.objects.create(user=user, author=author)
+        if request.method == "DELETE":
+            if remove_relation(Subscription, user=user.id, author=author.id):
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            return Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["Вы не подписаны на этого автора"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if user == author:
+            error = "Нельзя подписаться на самого себя"
+        elif not add_relation(Subscription, user=user.id, author=author.id):
+            error = "Вы уже подписаны на этого автора"
+        else:
+            author = self.add_recipes([self.get_subscriptions().get(id=author.id)])[0]
             serializer = SubscriptionSerializer(instance=author, context={"request": request})
             return Response(serializer.data)
-        if request.method == "DELETE":
-            subscribe = get_object_or_404(Subscription, user=user, author=author)
-            subscribe.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({api_settings.NON_FIELD_ERRORS_KEY: [error]}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class SubscriptionViewSet(ReadOnlyModelViewSet):
@@ -195,7 +385,7 @@ def set_password(request):
     if serializer.is_valid():
         user = request.user
         user.set_password(request.data["new_password"])
-        user.save()
+        user.save(update_fields=["password"])
         return Response(status=status.HTTP_204_NO_CONTENT)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -208,53 +398,74 @@ def del_token(request):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def get_token_stats(request):
+    return Response(get_token_cache_stats())
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+@renderer_classes([PlainTextRenderer])
+def get_metrics(request):
+    return Response(to_prometheus_text(collect()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def toggle_recipe_relation(request, recipe_id, model, serializer_class, messages):
+    recipe = get_object_or_404(Recipe, id=recipe_id)
+    if request.method == "DELETE":
+        if remove_relation(model, user=request.user.id, recipe=recipe.id):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({api_settings.NON_FIELD_ERRORS_KEY: [messages[1]]}, status=status.HTTP_400_BAD_REQUEST)
+    if add_relation(model, user=request.user.id, recipe=recipe.id):
+        serializer = serializer_class(model(user=request.user, recipe=recipe), context={"request": request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response({api_settings.NON_FIELD_ERRORS_KEY: [messages[0]]}, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(["POST", "DELETE"])
 @permission_classes([NicePerson])
 def shopping_cart(request, recipe_id):
-    recipe = get_object_or_404(Recipe, id=recipe_id)
-    if request.method == "POST":
-        request.data["id"] = recipe.id
-        serializer = ShoppingCartSerializer(data=request.data, context={"request": request})
-        if serializer.is_valid():
-            serializer.save(user=request.user, recipe=recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    elif request.method == "DELETE":
-        shopping_cart_recipe = get_object_or_404(ShoppingCart, recipe=recipe, user=request.user)
-        shopping_cart_recipe.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    return Response(status=status.HTTP_400_BAD_REQUEST)
+    return toggle_recipe_relation(
+        request,
+        recipe_id,
+        ShoppingCart,
+        ShoppingCartSerializer,
+        ("Рецепт уже есть в списке покупок", "Рецепта нет в списке покупок"),
+    )
 
 
 @api_view(["GET"])
 @permission_classes([NicePerson])
+@renderer_classes([FastJSONRenderer, PDFRenderer, CSVRenderer, PlainTextRenderer])
 def download_shopping_cart(request):
-    s_cart_obj = ShoppingCart.objects.filter(user=request.user)
     result = (
-        IngredientRecipe.objects.filter(recipe__in=s_cart_obj.values("recipe"))
-        .select_related("ingredients")
-        .values(name=F("ingredients__name"), mu=F("ingredients__measurement_unit"))
-        .annotate(total=Sum("amount"))
+        ShoppingListItem.objects.filter(user=request.user)
+        .values(name=F("ingredient__name"), mu=F("ingredient__measurement_unit"), total=F("amount"))
         .order_by("name")
     )
+    export_format = request.query_params.get("format", "pdf")
+    if export_format in STREAMS:
+        return get_shopping_cart_stream(result.iterator(), export_format)
     data = [[q["name"], q["mu"], q["total"]] for q in result]
     data.insert(0, ["Продукт", "Ед.изм.", "Кол-во"])
     return get_shopping_cart_pdf(data)
 
 
+@api_view(["GET"])
+@permission_classes([NicePerson])
+def shopping_list(request):
+    items = ShoppingListItem.objects.filter(user=request.user).select_related("ingredient").order_by("ingredient__name")
+    return Response(ShoppingListItemSerializer(items, many=True).data)
+
+
 @api_view(["POST", "DELETE"])
 @permission_classes([NicePerson])
 def favorite(request, recipe_id):
-    recipe = get_object_or_404(Recipe, id=recipe_id)
-    if request.method == "POST":
-        request.data["id"] = recipe.id
-        serializer = FavoriteSerializer(data=request.data, context={"request": request})
-        if serializer.is_valid():
-            serializer.save(user=request.user, recipe=recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    elif request.method == "DELETE":
-        favorite = get_object_or_404(Favorite, recipe=recipe, user=request.user)
-        favorite.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    return Response(status=status.HTTP_400_BAD_REQUEST)
+    return toggle_recipe_relation(
+        request,
+        recipe_id,
+        Favorite,
+        FavoriteSerializer,
+        ("Рецепт уже есть в избранном", "Рецепта нет в избранном"),
+    )
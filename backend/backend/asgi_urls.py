@@ -0,0 +1,9 @@
+from django.urls import include, path
+
+from backend import urls
+
+# The API goes first, the rest of the project is served as under WSGI.
+urlpatterns = [
+    path("api/", include("api.async_urls")),
+    *urls.urlpatterns,
+]
@@ -32,12 +32,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.request_metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "core.replica.ReplicaPinMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -70,6 +73,7 @@ if DEBUG:
         }
     }
 else:
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", default=0))
     DATABASES = {
         "default": {
             "ENGINE": os.getenv("DB_ENGINE", default="django.db.backends.postgresql"),
@@ -78,8 +82,41 @@ else:
             "PASSWORD": os.getenv("POSTGRES_PASSWORD", default="postgres"),
             "HOST": os.getenv("DB_HOST", default="postgres"),
             "PORT": os.getenv("DB_PORT", default=5432),
+            # Pooled connections go back to the pool after each request.
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", default=0 if DB_POOL_SIZE else 60)),
+            "HEALTH_CHECK_INTERVAL": int(os.getenv("DB_HEALTH_CHECK_INTERVAL", default=30)),
+            "POOL_SIZE": DB_POOL_SIZE,
+            "POOL_TIMEOUT": int(os.getenv("DB_POOL_TIMEOUT", default=10)),
+            "POOL_MAX_LIFETIME": int(os.getenv("DB_POOL_MAX_LIFETIME", default=30 * 60)),
         }
     }
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+        DATABASES["default"]["ENGINE"] = "core.db.backends.postgresql"
+
+if os.getenv("DB_REPLICA_NAME") or os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = dict(
+        DATABASES["default"],
+        NAME=os.getenv("DB_REPLICA_NAME", default=DATABASES["default"]["NAME"]),
+        TEST={"MIRROR": "default"},
+    )
+    if os.getenv("DB_REPLICA_HOST"):
+        DATABASES["replica"]["HOST"] = os.getenv("DB_REPLICA_HOST")
+        DATABASES["replica"]["PORT"] = os.getenv("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"])
+    DATABASE_ROUTERS = ["core.replica.ReplicaRouter"]
+
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", default=5))
+
+# Shared by all worker processes: memcached under docker-compose, otherwise a table made by ``createcachetable``.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", default="django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", default="django_cache"),
+    }
+}
+
+CATALOGUE_MAX_AGE = int(os.getenv("CATALOGUE_MAX_AGE", default=0))
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", default=300))
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -111,11 +148,31 @@ else:
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", default=2))
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", default=1024))
+
+ASGI_URLCONF = "backend.asgi_urls"
+ASYNC_VIEW_THREADS = int(os.getenv("ASYNC_VIEW_THREADS", default=8))
+
+METRICS_DIR = os.getenv("METRICS_DIR", default="")
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", default=5))
+SERVER_TIMING = os.getenv("SERVER_TIMING", default="True") == "True"
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
+    ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
     "DEFAULT_PAGINATION_CLASS": ("rest_framework.pagination.PageNumberPagination"),
     "PAGE_SIZE": 6,
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from core.db.health import (check_idle_connections,
+                                    mark_connections_used)
+        from core.request_metrics import install_query_recorder
+
+        request_started.connect(check_idle_connections)
+        request_finished.connect(mark_connections_used)
+        connection_created.connect(install_query_recorder)
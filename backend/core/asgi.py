@@ -0,0 +1,85 @@
+"""Async read path for ASGI deployments.
+
+Under ASGI Django runs every sync view on one thread per process, so a slow
+request holds up all others. The hot read endpoints are wrapped with
+``async_read_view`` in ``backend.asgi_urls``: their safe requests run on a
+bounded pool of ``ASYNC_VIEW_THREADS`` threads and the event loop keeps
+accepting connections meanwhile. Writes and the views left out (PDF export,
+image uploads) stay sync and are best routed to the WSGI workers, see
+``infra/nginx.conf``.
+
+Django 3.2 has no async ORM, the wrapped views run unchanged in the pool.
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers import asgi
+from django.db import close_old_connections
+
+from core.db.health import check_idle_connections, mark_connections_used
+
+THREADS = getattr(settings, "ASYNC_VIEW_THREADS", 8)
+URLCONF = getattr(settings, "ASGI_URLCONF", "backend.asgi_urls")
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # Created on first use, so forked workers do not share the threads.
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="async-view")
+    return _executor
+
+
+def call_view(view, request, *args, **kwargs):
+    # Request signals fire on the handler thread, the pool threads look
+    # after their own connections.
+    check_idle_connections()
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        # Render here, the handler would render on its single sync thread.
+        if callable(getattr(response, "render", None)):
+            response.render()
+        return response
+    finally:
+        mark_connections_used()
+        close_old_connections()
+
+
+def async_read_view(view):
+    """Serve safe requests to a sync ``view`` from the thread pool."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await sync_to_async(call_view, thread_sensitive=False, executor=get_executor())(
+                view, request, *args, **kwargs
+            )
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncReadHandler(asgi.ASGIHandler):
+    """ASGI handler that resolves requests against ``ASGI_URLCONF``."""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = URLCONF
+        return request, error_response
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return AsyncReadHandler()
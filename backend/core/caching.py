@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Entries of these backends are not seen by the other worker processes.
+PER_PROCESS_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_cache_shared(alias=DEFAULT_CACHE_ALIAS) -> bool:
+    """Whether all gunicorn and uvicorn workers read and write the same cache.
+
+    Invalidation through a per-process cache only reaches the process that
+    made the change, so data that must not outlive a change elsewhere is
+    only cached in a shared one. ``CACHE_SHARED`` overrides the guess, e.g.
+    for the benchmark, which serves every request from one process.
+    """
+    shared = getattr(settings, "CACHE_SHARED", None)
+    if shared is not None:
+        return shared
+    return not isinstance(caches[alias], PER_PROCESS_BACKENDS)
+
+
+def is_cache_in_database(alias=DEFAULT_CACHE_ALIAS) -> bool:
+    """Whether a cache hit is itself a query, i.e. ``DatabaseCache``."""
+    return isinstance(caches[alias], DatabaseCache)
@@ -0,0 +1,26 @@
+from django.db import router
+from django.db.models import F
+
+from core.models import CatalogueVersion
+
+VERSION_ID = 1
+
+
+def get_catalogue_version(using=None) -> int:
+    """Return the version of the tag and ingredient catalogues.
+
+    The version is a database row, bumped in the same transaction as the
+    change, so every worker sees it together with the changed rows.
+    """
+    using = using or router.db_for_read(CatalogueVersion)
+    version = CatalogueVersion.objects.using(using).filter(pk=VERSION_ID).values_list("version", flat=True).first()
+    if version is None:
+        using = router.db_for_write(CatalogueVersion)
+        version = CatalogueVersion.objects.using(using).get_or_create(pk=VERSION_ID)[0].version
+    return version
+
+
+def bump_catalogue_version():
+    using = router.db_for_write(CatalogueVersion)
+    if not CatalogueVersion.objects.using(using).filter(pk=VERSION_ID).update(version=F("version") + 1):
+        CatalogueVersion.objects.using(using).get_or_create(pk=VERSION_ID)
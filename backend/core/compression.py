@@ -0,0 +1,80 @@
+"""Compression of JSON responses.
+
+``GZipMiddleware`` compresses every body above 200 bytes. Here only JSON
+bodies of at least ``COMPRESSION_MIN_SIZE`` bytes are compressed, smaller
+ones gain too little for the CPU spent. Brotli is preferred when the
+``brotli`` package is installed and the client accepts it, gzip otherwise.
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+BROTLI_QUALITY = getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5)
+CONTENT_TYPES = ("application/json",)
+
+
+def get_accepted_encodings(header) -> set:
+    """Codings of an Accept-Encoding header, without those with ``q=0``."""
+    accepted = set()
+    for item in header.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = get_accepted_encodings(header)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(content, encoding) -> bytes:
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return compress_string(content)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if response.get("Content-Type", "").split(";")[0].strip() not in CONTENT_TYPES:
+            return response
+        if len(response.content) < MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        # The compressed body is no longer byte for byte the tagged one.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
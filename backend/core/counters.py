@@ -0,0 +1,34 @@
+from django.apps import apps
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = [
+    ("foods.Recipe", "favorites_count", "foods.Favorite", "recipe"),
+    ("foods.Recipe", "in_carts_count", "foods.ShoppingCart", "recipe"),
+    ("users.User", "recipes_count", "foods.Recipe", "author"),
+    ("users.User", "followers_count", "foods.Subscription", "author"),
+]
+
+
+def recount_counters() -> dict:
+    """Recompute the denormalized counters, one UPDATE per counter.
+
+    Returns the number of rows whose counter had drifted, keyed by
+    ``model.field``. Migrations keep their own copy of this logic.
+    """
+    drifted = {}
+    for model_name, field, related_name, related_field in COUNTERS:
+        model, related = apps.get_model(model_name), apps.get_model(related_name)
+        actual = Coalesce(
+            Subquery(
+                related.objects.filter(**{related_field: OuterRef("pk")})
+                .order_by()
+                .values(related_field)
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            0,
+        )
+        stale = model.objects.annotate(actual=actual).exclude(**{field: F("actual")}).values("pk")
+        drifted[f"{model_name}.{field}"] = model.objects.filter(pk__in=stale).update(**{field: actual})
+    return drifted
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool, PoolTimeoutError
+from core.metrics import db_connection_acquire_seconds
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def check_connection(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def reset_connection(connection):
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend with an optional per-process connection pool.
+
+    With ``POOL_SIZE`` above zero closing a connection hands it back to a
+    pool shared by all threads of the process, so threaded workers keep at
+    most ``POOL_SIZE`` connections open per alias. ``CONN_MAX_AGE`` should be
+    0 then, or threads hold on to their connections between requests.
+    Opening a connection, new or pooled, is timed in
+    ``db_connection_acquire_seconds``.
+    """
+
+    def get_pool(self):
+        size = self.settings_dict.get("POOL_SIZE") or 0
+        if size <= 0:
+            return None
+        pool = _pools.get(self.alias)
+        if pool is None:
+            with _pools_lock:
+                pool = _pools.get(self.alias)
+                if pool is None:
+                    pool = _pools[self.alias] = ConnectionPool(
+                        check=check_connection,
+                        reset=reset_connection,
+                        size=size,
+                        timeout=self.settings_dict.get("POOL_TIMEOUT", 10),
+                        check_interval=self.settings_dict.get("HEALTH_CHECK_INTERVAL"),
+                        max_lifetime=self.settings_dict.get("POOL_MAX_LIFETIME"),
+                    )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        try:
+            pool = self.get_pool()
+            if pool is None:
+                return super().get_new_connection(conn_params)
+            try:
+                connection = pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+            except PoolTimeoutError as error:
+                raise self.Database.OperationalError(str(error)) from error
+            self.isolation_level = self.settings_dict["OPTIONS"].get("isolation_level", connection.isolation_level)
+            return connection
+        finally:
+            db_connection_acquire_seconds.observe(time.perf_counter() - started, self.alias)
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Django keeps using a connection closed inside an atomic block until
+        # the block exits, such a connection must not reach another thread.
+        broken = self.in_atomic_block or (self.errors_occurred and not self.is_usable())
+        with self.wrap_database_errors:
+            pool.release(self.connection, broken=broken)
+        return None
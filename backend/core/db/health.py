@@ -0,0 +1,28 @@
+"""Health checks of persistent connections (``CONN_MAX_AGE`` above 0).
+
+Django checks a kept connection only after it raised an error, so the
+first request after a database restart or an idle timeout on the server
+side fails. Before a request every connection idle for longer than its
+``HEALTH_CHECK_INTERVAL`` is pinged and closed if dead; Django then opens
+a new one on first use.
+"""
+import time
+
+from django.db import connections
+
+
+def mark_connections_used(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.last_used_at = now
+
+
+def check_idle_connections(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        interval = connection.settings_dict.get("HEALTH_CHECK_INTERVAL")
+        if connection.connection is None or interval is None:
+            continue
+        if now - getattr(connection, "last_used_at", now) > interval and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections shared by the threads of a process.
+
+    At most ``size`` connections exist at a time, callers wait up to
+    ``timeout`` seconds for a free one. Idle connections are reused last in,
+    first out; those idle for longer than ``check_interval`` are pinged
+    before being handed out and those older than ``max_lifetime`` are closed.
+    The hooks keep it independent of the database driver:
+
+    * ``connect()``, passed to ``acquire``, opens a new connection;
+    * ``check(connection)`` returns whether it still works;
+    * ``reset(connection)`` prepares it for reuse, returns False to drop it.
+    """
+
+    def __init__(self, check, reset, size, timeout=10, check_interval=30, max_lifetime=None):
+        self.check = check
+        self.reset = reset
+        self.size = size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.max_lifetime = max_lifetime
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []
+        self.created = {}
+
+    def acquire(self, connect):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"нет свободных соединений в пуле за {self.timeout} с")
+        try:
+            while True:
+                with self.lock:
+                    connection, last_used = self.idle.pop() if self.idle else (None, None)
+                if connection is None:
+                    connection = connect()
+                    self.created[connection] = time.monotonic()
+                    return connection
+                now = time.monotonic()
+                if self.is_expired(connection, now) or (
+                    self.check_interval is not None
+                    and now - last_used > self.check_interval
+                    and not self.check(connection)
+                ):
+                    self.discard(connection)
+                    continue
+                return connection
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection, broken=False):
+        try:
+            if broken or self.is_expired(connection, time.monotonic()) or not self.reset(connection):
+                self.discard(connection)
+                return
+            with self.lock:
+                self.idle.append((connection, time.monotonic()))
+        except Exception:
+            self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def is_expired(self, connection, now):
+        return self.max_lifetime is not None and now - self.created.get(connection, now) > self.max_lifetime
+
+    def discard(self, connection):
+        self.created.pop(connection, None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
@@ -0,0 +1,60 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+HEADER = ["Продукт", "Ед.изм.", "Кол-во"]
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "txt": "text/plain; charset=utf-8",
+    "json": "application/json",
+}
+
+
+class Echo:
+    """File-like object that hands written lines back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow([row["name"], row["mu"], row["total"]])
+
+
+def stream_txt(rows):
+    yield "Список покупок:\n"
+    for row in rows:
+        yield f"{row['name']} ({row['mu']}) — {row['total']}\n"
+
+
+def stream_json(rows):
+    yield "["
+    separator = ""
+    for row in rows:
+        item = {"name": row["name"], "measurement_unit": row["mu"], "amount": row["total"]}
+        yield separator + json.dumps(item, ensure_ascii=False)
+        separator = ","
+    yield "]"
+
+
+STREAMS = {
+    "csv": stream_csv,
+    "txt": stream_txt,
+    "json": stream_json,
+}
+
+
+def get_shopping_cart_stream(rows, export_format: str):
+    """Stream the shopping list rows in one of the ``STREAMS`` formats.
+
+    ``rows`` is consumed lazily, so pass a queryset ``.iterator()`` to keep
+    memory flat for large carts.
+    """
+    response = StreamingHttpResponse(STREAMS[export_format](rows), content_type=CONTENT_TYPES[export_format])
+    response["Content-Disposition"] = f'attachment; filename="shopping_cart.{export_format}"'
+    return response
@@ -0,0 +1,123 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = getattr(settings, "IMAGE_VARIANT_WIDTHS", (320, 640, 1280))
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix="image-variants"
+        )
+    return _executor
+
+
+def get_variant_name(image_name, width, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f"{os.path.dirname(image_name)}/variants/{stem}-{width}.{extension}"
+
+
+def render_variants(storage, image_name) -> dict:
+    """Write resized copies of an image and return ``{width: {format: name}}``.
+
+    Only widths smaller than the source are rendered, small images are served
+    as they are.
+    """
+    with storage.open(image_name, "rb") as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source.load()
+    variants = {}
+    for width in VARIANT_WIDTHS:
+        if width >= source.width:
+            continue
+        height = round(source.height * width / source.width)
+        resized = source.convert("RGBA" if "A" in source.getbands() else "RGB").resize((width, height), Image.LANCZOS)
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            image = resized if image_format == "WEBP" else resized.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **options)
+            name = get_variant_name(image_name, width, extension)
+            variants.setdefault(str(width), {})[extension] = storage.save_derived(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def delete_variants(storage, image_name):
+    for width in VARIANT_WIDTHS:
+        for extension in VARIANT_FORMATS:
+            storage.delete(get_variant_name(image_name, width, extension))
+
+
+def generate_variants(recipe_id):
+    from foods.models import Recipe
+
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).only("image", "image_variants").first()
+        if recipe is None or not recipe.image:
+            return
+        name = recipe.image.name
+        # Identical uploads share one file, so they share the variants as well.
+        variants = (
+            Recipe.objects.filter(image=name, image_variants__source=name)
+            .exclude(pk=recipe_id)
+            .values_list("image_variants", flat=True)
+            .first()
+        )
+        if variants is None:
+            variants = render_variants(recipe.image.storage, name)
+            variants["source"] = name
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(image_variants=variants)
+        if not updated and not Recipe.objects.filter(image=name).exists():
+            # The image was replaced or removed while the variants were rendered.
+            delete_variants(recipe.image.storage, name)
+    except Exception:
+        logger.exception("Не удалось подготовить уменьшенные копии картинки рецепта %s", recipe_id)
+
+
+def generate_variants_in_thread(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe_id):
+    """Render the variants after the current transaction is committed.
+
+    With ``IMAGE_VARIANT_WORKERS = 0`` the work is done synchronously.
+    """
+
+    def submit():
+        if settings.IMAGE_VARIANT_WORKERS:
+            get_executor().submit(generate_variants_in_thread, recipe_id)
+        else:
+            generate_variants(recipe_id)
+
+    transaction.on_commit(submit)
+
+
+def get_variant_urls(recipe, request) -> dict:
+    return build_variant_urls(recipe.image.storage, recipe.image_variants, request)
+
+
+def build_variant_urls(storage, variants, request) -> dict:
+    return {
+        width: {extension: request.build_absolute_uri(storage.url(name)) for extension, name in files.items()}
+        for width, files in variants.items()
+        if width != "source"
+    }
@@ -0,0 +1,79 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import router
+
+from core.catalogue import get_catalogue_version
+
+SEARCH_LIMIT = getattr(settings, "INGREDIENT_SEARCH_LIMIT", 50)
+
+
+def normalize(text: str) -> str:
+    return text.casefold().replace("ё", "е")
+
+
+class IngredientIndex:
+    """Per-process sorted index over ``Ingredient.name`` for autocomplete.
+
+    Prefix matches are found with a binary search over the normalized names
+    and come first, substring matches are only scanned for when the limit has
+    not been reached yet. The index is rebuilt lazily whenever the catalogue
+    version changes. The version is a database row bumped together with the
+    change, so an edit made through any worker reaches every index. Views
+    that have already read the version pass it in to save the round-trip.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._rows = []
+        self._version = None
+
+    def build(self):
+        from foods.models import Ingredient
+
+        # Kept until the next catalogue change, so it is read from the primary.
+        entries = sorted(
+            (normalize(name), pk, {"id": pk, "name": name, "measurement_unit": unit})
+            for pk, name, unit in Ingredient.objects.using(router.db_for_write(Ingredient)).values_list(
+                "id", "name", "measurement_unit"
+            )
+        )
+        return [key for key, _, _ in entries], [row for _, _, row in entries]
+
+    def get_entries(self, version=None):
+        from foods.models import Ingredient
+
+        if version is None:
+            version = get_catalogue_version(using=router.db_for_write(Ingredient))
+        # Versions only grow. An older one comes from a lagging replica and
+        # is served by the newer index instead of rebuilding back and forth.
+        if self._version is None or version > self._version:
+            with self._lock:
+                if self._version is None or version > self._version:
+                    self._keys, self._rows = self.build()
+                    self._version = version
+        return self._keys, self._rows
+
+    def search(self, query: str, limit: int = None, version: int = None):
+        keys, rows = self.get_entries(version)
+        query = normalize(query)
+        if limit is None:
+            limit = len(rows)
+
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit and keys[end].startswith(query):
+            end += 1
+        result = rows[start:end]
+        if len(result) < limit and query:
+            for key, row in zip(keys, rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
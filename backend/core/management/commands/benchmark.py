@@ -0,0 +1,450 @@
+import gc
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import timeit
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import URLPattern, URLResolver, resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from api.authentication import get_token_cache_stats
+from api.renderers import FastJSONRenderer
+from core import compression
+from core.caching import is_cache_in_database
+from core.counters import recount_counters
+from core.shopping_list import rebuild_shopping_lists
+from foods.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                          ShoppingCart, Subscription, Tag)
+from users.models import User
+
+BUDGETS_FILE = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "benchmark_budgets.json"))
+# A written latency budget is the measured p99 times LATENCY_MARGIN plus LATENCY_SLACK_MS,
+# the slack covers timer noise on endpoints that take a few milliseconds.
+LATENCY_MARGIN = 2
+LATENCY_SLACK_MS = 2
+
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA"
+    "7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=="
+)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def count_cache_queries(queries) -> int:
+    """Queries to the ``DatabaseCache`` table, they are part of the query count too."""
+    if not is_cache_in_database():
+        return 0
+    return sum(cache._table in query["sql"] for query in queries)
+
+
+def get_api_routes(patterns=api_urls.urlpatterns, prefix="api/"):
+    """Routes of api/urls.py without the DRF format suffix variants."""
+    routes = set()
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern).lstrip("^")
+        if isinstance(pattern, URLResolver):
+            routes |= get_api_routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern) and "(?P<format>" not in route:
+            routes.add(route)
+    return routes
+
+
+class Command(BaseCommand):
+    help = "Замер производительности эндпоинтов API на тестовой базе"
+
+    def add_arguments(self, parser):
+        self.add_dataset_arguments(parser)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--output", help="файл для результатов в формате JSON")
+        parser.add_argument("--budgets", default=BUDGETS_FILE, help="файл с бюджетами эндпоинтов")
+        parser.add_argument("--update-budgets", action="store_true", help="записать бюджеты по результатам замера")
+
+    def add_dataset_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--recipes", type=int, default=300)
+        parser.add_argument("--ingredients", type=int, default=500)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--favorites", type=int, default=10, help="избранных рецептов на пользователя")
+        parser.add_argument("--subscriptions", type=int, default=10, help="подписок на пользователя")
+        parser.add_argument("--cart", type=int, default=5, help="рецептов в списке покупок на пользователя")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with self.seeded_database(options) as context:
+            call_command("check_recipe_parity", users=3, stdout=self.stdout)
+            # Seeding leaves a lot of garbage, collect it before the timing starts.
+            gc.collect()
+            results, payloads = self.run(context, options)
+
+        report = {
+            "meta": dict(self.get_meta(options), iterations=options["iterations"]),
+            "routes": results,
+            "token_cache": get_token_cache_stats(),
+            "encoding": self.measure_encoding(payloads),
+        }
+        self.print_report(results)
+        self.stdout.write("кеш токенов: попаданий {hits}, промахов {misses}".format(**report["token_cache"]))
+        self.print_encoding(report["encoding"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options["update_budgets"]:
+            self.write_budgets(results, options["budgets"])
+            return
+        self.check_budgets(results, options["budgets"])
+
+    @contextmanager
+    def seeded_database(self, options):
+        """Test database filled by ``seed``, dropped on exit."""
+        random.seed(options["seed"])
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # The configured cache is measured as is, create_test_db has created the DatabaseCache table.
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, IMAGE_VARIANT_WORKERS=0, DATABASE_ROUTERS=[]
+            ):
+                cache.clear()
+                yield self.seed(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def get_meta(self, options):
+        return {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "engine": connection.vendor,
+            "dataset": {
+                name: options[name]
+                for name in (
+                    "users",
+                    "recipes",
+                    "ingredients",
+                    "ingredients_per_recipe",
+                    "favorites",
+                    "subscriptions",
+                    "cart",
+                )
+            },
+        }
+
+    def seed(self, options):
+        password = "benchmark-password"
+        password_hash = make_password(password)
+        User.objects.bulk_create(
+            User(
+                username=f"bench{i}",
+                email=f"bench{i}@example.com",
+                first_name="Имя",
+                last_name="Фамилия",
+                password=password_hash,
+            )
+            for i in range(options["users"] + 1)
+        )
+        users = list(User.objects.order_by("id"))
+        login_user, users = users[0], users[1:]
+        Tag.objects.bulk_create(Tag(name=f"Тег {i}", color=f"#{i:06x}", slug=f"tag{i}") for i in range(3))
+        tags = list(Tag.objects.order_by("id"))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"ингредиент {i}", measurement_unit="г") for i in range(options["ingredients"])
+        )
+        ingredients = list(Ingredient.objects.values_list("id", flat=True))
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=random.choice(users),
+                name=f"Рецепт {i}",
+                image="recipes/benchmark.png",
+                image_variants={
+                    "source": "recipes/benchmark.png",
+                    "320": {
+                        "webp": "recipes/variants/benchmark-320.webp",
+                        "jpeg": "recipes/variants/benchmark-320.jpeg",
+                    },
+                },
+                text="Описание рецепта. " * 20,
+                cooking_time=random.randint(1, 120),
+            )
+            for i in range(options["recipes"])
+        )
+        recipes = list(Recipe.objects.values_list("id", flat=True))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe_id=recipe, ingredients_id=ingredient, amount=random.randint(1, 500))
+            for recipe in recipes
+            for ingredient in random.sample(ingredients, min(options["ingredients_per_recipe"], len(ingredients)))
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe, tag_id=random.choice(tags).id) for recipe in recipes
+        )
+        for model, count, targets in (
+            (Favorite, options["favorites"], recipes),
+            (ShoppingCart, options["cart"], recipes),
+        ):
+            model.objects.bulk_create(
+                model(user=user, recipe_id=recipe)
+                for user in users
+                for recipe in random.sample(targets, min(count, len(targets)))
+            )
+        Subscription.objects.bulk_create(
+            Subscription(user=user, author=author)
+            for user in users
+            for author in random.sample([u for u in users if u != user], min(options["subscriptions"], len(users) - 1))
+        )
+        recount_counters()
+        rebuild_shopping_lists()
+
+        admin = User.objects.create(
+            username="bench-admin", email="bench-admin@example.com", password=password_hash, is_staff=True
+        )
+
+        viewer = users[0]
+        return {
+            "admin": admin,
+            "viewer": viewer,
+            "login_user": login_user,
+            "password": password,
+            "tag": tags[0],
+            "ingredients": ingredients,
+            "recipe": Recipe.objects.exclude(favorite__user=viewer).exclude(shopping_cart__user=viewer).first(),
+            "author": User.objects.exclude(id=viewer.id).exclude(subscribed__user=viewer).first() or users[-1],
+        }
+
+    def get_scenarios(self, context):
+        viewer, recipe, author = context["viewer"], context["recipe"], context["author"]
+        recipe_data = {
+            "name": "Новый рецепт",
+            "text": "Описание",
+            "cooking_time": 10,
+            "tags": [context["tag"].id],
+            "ingredients": [{"id": pk, "amount": 10} for pk in context["ingredients"][:10]],
+        }
+
+        def catalogue():
+            yield "tags-list", "get", "/api/tags/", None, None
+            yield "tags-detail", "get", f"/api/tags/{context['tag'].id}/", None, None
+            yield "ingredients-list", "get", "/api/ingredients/", None, None
+            yield "ingredients-search", "get", "/api/ingredients/?name=ингредиент 1", None, None
+            yield "ingredients-detail", "get", f"/api/ingredients/{context['ingredients'][0]}/", None, None
+            yield "api-root", "get", "/api/", None, None
+
+        def recipes():
+            yield "recipes-list-anonymous", "get", "/api/recipes/", None, None
+            yield "recipes-list", "get", "/api/recipes/", None, viewer
+            yield "recipes-list-cursor", "get", "/api/recipes/?cursor=", None, viewer
+            yield "recipes-list-tags", "get", f"/api/recipes/?tags={context['tag'].slug}", None, viewer
+            yield "recipes-list-author", "get", f"/api/recipes/?author={author.id}", None, viewer
+            yield "recipes-search", "get", "/api/recipes/?search=рецепт 1", None, viewer
+            yield "recipes-list-favorited", "get", "/api/recipes/?is_favorited=1", None, viewer
+            yield "recipes-list-cart", "get", "/api/recipes/?is_in_shopping_cart=1", None, viewer
+            yield "recipes-detail", "get", f"/api/recipes/{recipe.id}/", None, viewer
+            response = yield "recipes-create", "post", "/api/recipes/", dict(recipe_data, image=IMAGE), viewer
+            created = response.json()["id"]
+            yield "recipes-update", "patch", f"/api/recipes/{created}/", recipe_data, viewer
+            yield "recipes-delete", "delete", f"/api/recipes/{created}/", None, viewer
+
+        def relations():
+            yield "favorite-add", "post", f"/api/recipes/{recipe.id}/favorite/", None, viewer
+            yield "favorite-remove", "delete", f"/api/recipes/{recipe.id}/favorite/", None, viewer
+            yield "shopping-cart-add", "post", f"/api/recipes/{recipe.id}/shopping_cart/", None, viewer
+            yield "shopping-cart-remove", "delete", f"/api/recipes/{recipe.id}/shopping_cart/", None, viewer
+            yield "shopping-cart-pdf", "get", "/api/recipes/download_shopping_cart/", None, viewer
+            yield "shopping-cart-csv", "get", "/api/recipes/download_shopping_cart/?format=csv", None, viewer
+            yield "shopping-list", "get", "/api/recipes/shopping_list/", None, viewer
+            yield "subscribe", "post", f"/api/users/{author.id}/subscribe/", None, viewer
+            yield "unsubscribe", "delete", f"/api/users/{author.id}/subscribe/", None, viewer
+
+        def users():
+            yield "users-list", "get", "/api/users/", None, viewer
+            yield "users-detail", "get", f"/api/users/{author.id}/", None, viewer
+            yield "users-me", "get", "/api/users/me/", None, viewer
+            yield "users-subscriptions", "get", "/api/users/subscriptions/?recipes_limit=3", None, viewer
+            number = User.objects.count()
+            yield "users-create", "post", "/api/users/", {
+                "email": f"new{number}@example.com",
+                "username": f"new{number}",
+                "first_name": "Имя",
+                "last_name": "Фамилия",
+                "password": "new-password-123",
+            }, None
+
+        def auth():
+            login_user, password = context["login_user"], context["password"]
+            response = yield "token-login", "post", "/api/auth/token/login/", {
+                "email": login_user.email,
+                "password": password,
+            }, None
+            yield "token-logout", "post", "/api/auth/token/logout/", None, response.json()["auth_token"]
+            yield "set-password", "post", "/api/users/set_password/", {
+                "current_password": password,
+                "new_password": password,
+            }, login_user
+            yield "token-stats", "get", "/api/auth/token/stats/", None, context["admin"]
+            yield "metrics", "get", "/api/_metrics/", None, context["admin"]
+
+        return [catalogue, recipes, relations, users, auth]
+
+    def run(self, context, options):
+        """Walk the scenarios ``iterations`` times.
+
+        Returns the per-route results and the last JSON body of every GET,
+        for ``measure_encoding``.
+        """
+        client = APIClient()
+        samples, payloads, routes = {}, {}, {}
+        for iteration in range(options["iterations"]):
+            for scenario in self.get_scenarios(context):
+                steps = scenario()
+                response = None
+                while True:
+                    try:
+                        name, method, path, data, user = steps.send(response)
+                    except StopIteration:
+                        break
+                    self.authenticate(client, user)
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = getattr(client, method)(path, data, format="json")
+                        content = b"".join(response.streaming_content) if response.streaming else response.content
+                        elapsed = time.perf_counter() - started
+                    if response.status_code >= 400:
+                        raise CommandError(f"{name}: {method.upper()} {path} вернул {response.status_code}")
+                    routes[name] = resolve(path.split("?")[0]).route
+                    self.record(samples.setdefault(name, {}), elapsed, queries.captured_queries, content)
+                    if method == "get" and isinstance(getattr(response, "data", None), (dict, list)):
+                        payloads[name] = response.data
+
+        missing = get_api_routes() - set(routes.values())
+        if missing:
+            raise CommandError(f"маршруты без замеров: {', '.join(sorted(missing))}")
+
+        results = {
+            name: {
+                "route": routes[name],
+                "requests": len(sample["times"]),
+                "queries": max(sample["queries"]),
+                "cache_queries": max(sample["cache_queries"]),
+                "p50_ms": round(percentile(sample["times"], 50), 3),
+                "p95_ms": round(percentile(sample["times"], 95), 3),
+                "p99_ms": round(percentile(sample["times"], 99), 3),
+                "bytes": max(sample["bytes"]),
+            }
+            for name, sample in samples.items()
+        }
+        return results, payloads
+
+    @staticmethod
+    def authenticate(client, user):
+        """``user`` is a raw token, a user to log in with their token, or None."""
+        client.credentials()
+        if isinstance(user, str):
+            client.credentials(HTTP_AUTHORIZATION=f"Token {user}")
+        elif user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    @staticmethod
+    def record(sample, elapsed, queries, content):
+        sample.setdefault("times", []).append(elapsed * 1000)
+        sample.setdefault("queries", []).append(len(queries))
+        sample.setdefault("cache_queries", []).append(count_cache_queries(queries))
+        sample.setdefault("bytes", []).append(len(content))
+
+    def print_report(self, results):
+        self.stdout.write(
+            f"{'эндпоинт':<26}{'запросов':>9}{'из них кеш':>11}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'байт':>10}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<26}{result['queries']:>9}{result['cache_queries']:>11}{result['p50_ms']:>10.2f}"
+                f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['bytes']:>10}"
+            )
+
+    def measure_encoding(self, payloads, repeat=50):
+        """CPU cost of rendering and compressing the JSON bodies worth compressing."""
+
+        def cost(function):
+            return round(timeit.timeit(function, number=repeat) / repeat * 1000, 3)
+
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+        results = {}
+        for name, data in payloads.items():
+            body = stdlib.render(data)
+            if len(body) < compression.MIN_SIZE:
+                continue
+            if fast.render(data) != body:
+                raise CommandError(f"{name}: FastJSONRenderer отдаёт другой JSON, чем JSONRenderer")
+            result = results[name] = {
+                "bytes": len(body),
+                "json_ms": cost(lambda: stdlib.render(data)),
+                "fast_json_ms": cost(lambda: fast.render(data)),
+            }
+            for encoding in ("gzip", "br"):
+                if encoding == "br" and compression.brotli is None:
+                    continue
+                result[f"{encoding}_bytes"] = len(compression.compress(body, encoding))
+                result[f"{encoding}_ms"] = cost(lambda: compression.compress(body, encoding))
+        return results
+
+    def print_encoding(self, results):
+        self.stdout.write(
+            f"\n{'рендеринг и сжатие':<26}{'json мс':>9}{'fast мс':>9}{'байт':>8}"
+            f"{'gzip мс':>9}{'gzip байт':>11}{'br мс':>8}{'br байт':>9}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<26}{result['json_ms']:>9.3f}{result['fast_json_ms']:>9.3f}{result['bytes']:>8}"
+                f"{result['gzip_ms']:>9.3f}{result['gzip_bytes']:>11}"
+                f"{result.get('br_ms', '-'):>8}{result.get('br_bytes', '-'):>9}"
+            )
+
+    def write_budgets(self, results, path):
+        budgets = {
+            name: {
+                "queries": result["queries"],
+                "p99_ms": math.ceil(result["p99_ms"] * LATENCY_MARGIN + LATENCY_SLACK_MS),
+            }
+            for name, result in results.items()
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(budgets, file, ensure_ascii=False, indent=2)
+            file.write("\n")
+        self.stdout.write(f"бюджеты записаны в {os.path.abspath(path)}")
+
+    def check_budgets(self, results, path):
+        if not os.path.exists(path):
+            self.stderr.write(f"файл бюджетов {path} не найден, проверка пропущена")
+            return
+        with open(path, encoding="utf-8") as file:
+            budgets = json.load(file)
+        failures = []
+        for name, budget in budgets.items():
+            result = results.get(name)
+            if result is None:
+                failures.append(f"{name}: нет замера")
+                continue
+            if result["queries"] > budget["queries"]:
+                failures.append(f"{name}: {result['queries']} запросов к БД при бюджете {budget['queries']}")
+            if result["p99_ms"] > budget["p99_ms"]:
+                failures.append(f"{name}: p99 {result['p99_ms']} мс при бюджете {budget['p99_ms']} мс")
+        if failures:
+            raise CommandError("превышены бюджеты:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("все эндпоинты уложились в бюджеты"))
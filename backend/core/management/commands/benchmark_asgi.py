@@ -0,0 +1,212 @@
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import CommandError
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from core.asgi import THREADS, AsyncReadHandler
+from core.management.commands import benchmark
+
+
+class Command(benchmark.Command):
+    help = (
+        "Сравнение пропускной способности и p99 горячих GET-эндпоинтов под WSGI и ASGI "
+        "при одновременных клиентах. Обработчики вызываются в процессе, без сетевого сервера."
+    )
+
+    def add_arguments(self, parser):
+        self.add_dataset_arguments(parser)
+        parser.add_argument("--concurrency", type=int, default=16, help="одновременных клиентов")
+        parser.add_argument("--requests", type=int, default=600, help="запросов к каждому обработчику")
+        parser.add_argument(
+            "--wsgi-threads",
+            type=int,
+            default=1,
+            help="запросов, которые WSGI-воркер обрабатывает одновременно (1 — sync-воркер gunicorn)",
+        )
+        parser.add_argument(
+            "--db-latency-ms",
+            type=float,
+            default=1.0,
+            help="задержка на каждый запрос к БД, имитирует сетевой путь до PostgreSQL",
+        )
+        parser.add_argument("--output", help="файл для результатов в формате JSON")
+
+    def handle(self, *args, **options):
+        delay = options["db_latency_ms"] / 1000
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(connection, **kwargs):
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+
+        with self.seeded_database(options) as context:
+            requests = self.get_requests(context)
+            schedule = [requests[i % len(requests)] for i in range(options["requests"])]
+            if delay:
+                connection_created.connect(add_latency)
+            try:
+                results = {
+                    "wsgi": self.run_wsgi(schedule, options),
+                    "asgi": self.run_asgi(schedule, options),
+                }
+            finally:
+                connection_created.disconnect(add_latency)
+
+        report = {
+            "meta": dict(
+                self.get_meta(options),
+                concurrency=options["concurrency"],
+                wsgi_threads=options["wsgi_threads"],
+                asgi_threads=THREADS,
+                db_latency_ms=options["db_latency_ms"],
+            ),
+            "servers": results,
+        }
+        self.print_comparison(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def get_requests(self, context):
+        token = Token.objects.get_or_create(user=context["viewer"])[0].key
+        recipe = context["recipe"]
+        return [
+            ("recipes-list", "/api/recipes/", "", None),
+            ("recipes-list-auth", "/api/recipes/", "", token),
+            ("recipes-detail", f"/api/recipes/{recipe.id}/", "", token),
+            ("tags-list", "/api/tags/", "", None),
+            ("ingredients-list", "/api/ingredients/", urlencode({"name": "ингредиент 1"}), None),
+            ("users-me", "/api/users/me/", "", token),
+        ]
+
+    def run_wsgi(self, schedule, options):
+        handler = WSGIHandler()
+
+        def serve(request):
+            name, path, query, token = request
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "SCRIPT_NAME": "",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "SERVER_NAME": "testserver",
+                "SERVER_PORT": "80",
+                "SERVER_PROTOCOL": "HTTP/1.1",
+                "HTTP_HOST": "testserver",
+                "wsgi.version": (1, 0),
+                "wsgi.url_scheme": "http",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.errors": sys.stderr,
+                "wsgi.multithread": True,
+                "wsgi.multiprocess": False,
+                "wsgi.run_once": False,
+            }
+            if token:
+                environ["HTTP_AUTHORIZATION"] = f"Token {token}"
+            status = []
+            response = handler(environ, lambda code, headers: status.append(int(code.split()[0])))
+            b"".join(response)
+            response.close()
+            return status[0]
+
+        with ThreadPoolExecutor(max_workers=options["wsgi_threads"]) as worker:
+
+            def call(request):
+                # Latency includes the wait in the worker queue, as behind gunicorn.
+                started = time.perf_counter()
+                status = worker.submit(serve, request).result()
+                return request[0], status, time.perf_counter() - started
+
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as clients:
+                started = time.perf_counter()
+                samples = list(clients.map(call, schedule))
+                elapsed = time.perf_counter() - started
+        return self.summarize(samples, elapsed)
+
+    def run_asgi(self, schedule, options):
+        handler = AsyncReadHandler()
+
+        async def call(request):
+            name, path, query, token = request
+            headers = [(b"host", b"testserver")]
+            if token:
+                headers.append((b"authorization", f"Token {token}".encode()))
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": headers,
+                "client": ("127.0.0.1", 0),
+                "server": ("testserver", 80),
+            }
+            status = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            return name, status[0], time.perf_counter() - started
+
+        async def main():
+            pending = list(reversed(schedule))
+            samples = []
+
+            async def client():
+                while pending:
+                    samples.append(await call(pending.pop()))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(options["concurrency"])))
+            return samples, time.perf_counter() - started
+
+        samples, elapsed = asyncio.run(main())
+        return self.summarize(samples, elapsed)
+
+    def summarize(self, samples, elapsed):
+        errors = [f"{name}: {status}" for name, status, _ in samples if status >= 400]
+        if errors:
+            raise CommandError("ошибки в ответах:\n" + "\n".join(sorted(set(errors))))
+        times = [seconds * 1000 for _, _, seconds in samples]
+        by_name = {}
+        for name, _, seconds in samples:
+            by_name.setdefault(name, []).append(seconds * 1000)
+        return {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(benchmark.percentile(times, 50), 3),
+            "p99_ms": round(benchmark.percentile(times, 99), 3),
+            "routes": {name: round(benchmark.percentile(values, 99), 3) for name, values in by_name.items()},
+        }
+
+    def print_comparison(self, results):
+        self.stdout.write(f"{'обработчик':<12}{'запросов':>9}{'запр/с':>10}{'p50 мс':>10}{'p99 мс':>10}")
+        for server, result in results.items():
+            self.stdout.write(
+                f"{server:<12}{result['requests']:>9}{result['rps']:>10.1f}"
+                f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            )
+        self.stdout.write(f"\n{'p99 по эндпоинтам, мс':<26}{'wsgi':>10}{'asgi':>10}")
+        for name, value in results["wsgi"]["routes"].items():
+            self.stdout.write(f"{name:<26}{value:>10.2f}{results['asgi']['routes'][name]:>10.2f}")
@@ -0,0 +1,32 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.representations import check_recipe_parity
+from api.views import get_recipes_queryset
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Сверка быстрого пути списка рецептов с GetRecipesSerializer байт в байт"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5, help="сколько пользователей проверить, кроме анонима")
+        parser.add_argument("--batch", type=int, default=100, help="рецептов за одну сверку")
+
+    def handle(self, *args, **options):
+        viewers = [AnonymousUser(), *User.objects.order_by("id")[: options["users"]]]
+        recipes = get_recipes_queryset()
+        ids = list(recipes.values_list("id", flat=True))
+        mismatches = set()
+        for viewer in viewers:
+            request = Request(APIRequestFactory().get("/api/recipes/"))
+            request.user = viewer
+            size = options["batch"]
+            for start in range(0, len(ids), size):
+                batch = recipes.filter(id__in=ids[start:start + size])
+                mismatches.update(check_recipe_parity(batch, request))
+        if mismatches:
+            raise CommandError(f"быстрый путь расходится с сериализатором для рецептов: {sorted(mismatches)}")
+        self.stdout.write(f"рецептов: {len(ids)}, пользователей: {len(viewers)}, расхождений нет")
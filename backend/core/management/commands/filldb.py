@@ -1,71 +1,276 @@
+import json
 import os
+import time
 from csv import DictReader
+from itertools import islice
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
+from core.catalogue import bump_catalogue_version
 from foods import models
 
-DIR_CSV = os.path.join(settings.BASE_DIR, "..", "data/")
+DIR_DATA = os.path.join(settings.BASE_DIR, "..", "data")
 
-print(DIR_CSV)
-
-IMPORTS_CSV = [
+IMPORTS = [
     {
-        "file": "ingredients.csv",
+        "name": "ingredients",
         "model": models.Ingredient,
         "inst_fields": [],
+        "unique": ("name", "measurement_unit"),
         "add": False,
     },
 ]
 
+MAX_ERRORS_SHOWN = 10
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8") as csvfile:
+        yield from DictReader(csvfile, delimiter=",")
+
+
+class JSONArrayReader:
+    """Incremental parser of a top level JSON array of objects.
+
+    The items are parsed by ``json``, the brackets and commas between them
+    are checked here, so a missing comma is an error just like with
+    ``json.load``.
+    """
+
+    # (expected, character) -> expected next: [ -> first -> item , item ... ] -> end
+    TRANSITIONS = {
+        ("[", "["): "first",
+        ("first", "]"): "end",
+        (",", ","): "item",
+        (",", "]"): "end",
+    }
+    NEED_MORE = object()
+    ERRORS = {
+        "[": "ожидался JSON-массив",
+        ",": "некорректный JSON, между объектами нужна запятая",
+        "end": "данные после конца массива",
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self.decoder = json.JSONDecoder()
+        self.buffer, self.pos, self.expected, self.eof = "", 0, "[", False
+
+    def feed(self, chunk):
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def error(self, message):
+        return CommandError(f"{self.path}: {message}")
+
+    def items(self):
+        """Yield the items complete in the buffer, stop when more data is needed."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos == len(self.buffer):
+                return
+            state = self.TRANSITIONS.get((self.expected, self.buffer[self.pos]))
+            if state is not None:
+                self.expected, self.pos = state, self.pos + 1
+                continue
+            if self.expected in self.ERRORS:
+                raise self.error(self.ERRORS[self.expected])
+            item = self.decode()
+            if item is self.NEED_MORE:
+                return
+            yield item
+
+    def decode(self):
+        try:
+            item, end = self.decoder.raw_decode(self.buffer, self.pos)
+        except ValueError:
+            if self.eof:
+                raise self.error("некорректный JSON")
+            return self.NEED_MORE
+        # A number at the end of the buffer may go on in the next chunk.
+        if end == len(self.buffer) and not self.eof:
+            return self.NEED_MORE
+        self.expected, self.pos = ",", end
+        return item
+
+
+def read_json(path, chunk_size=64 * 1024):
+    """Yield the objects of a top level JSON array without loading the file."""
+    reader = JSONArrayReader(path)
+    with open(path, encoding="utf-8") as jsonfile:
+        while not reader.eof:
+            reader.feed(jsonfile.read(chunk_size))
+            yield from reader.items()
+    if reader.expected != "end":
+        raise reader.error("некорректный JSON")
+
+
+READERS = {
+    "csv": read_csv,
+    "json": read_json,
+}
 
-def write_to_model(row, model, inst_fields):
-    if inst_fields:
-        for field in inst_fields:
-            temp = field["model"].objects.get(id=row.pop(field["csv_row"]))
-            row[field["field"]] = temp
-    new = model(**row)
-    new.save()
 
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
-def write_m2m_model(row, model, parent, child):
-    parent_inst = model.objects.get(id=row[parent])
-    temp = child["model"].objects.get(id=row.pop(child["csv_row"]))
-    getattr(parent_inst, child["field"]).add(temp)
+
+def get_fk_maps(in_data):
+    return {
+        field["field"]: dict(
+            (str(key), pk) for key, pk in field["model"].objects.values_list(field.get("lookup", "id"), "id")
+        )
+        for field in in_data["inst_fields"]
+    }
+
+
+def get_existing(in_data):
+    """Primary keys of the rows already in the table, by their unique fields."""
+    unique = in_data.get("unique")
+    if not unique or in_data["add"]:
+        return {}
+    return {
+        tuple(str(value) for value in values[1:]): values[0]
+        for values in in_data["model"].objects.values_list("id", *unique).iterator()
+    }
+
+
+def get_key(row, fields):
+    return tuple(str(row[field]) for field in fields)
 
 
 class Command(BaseCommand):
-    help = "Наполнение базы данных из csv файлов"
+    help = "Наполнение базы данных из csv или json файлов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(READERS), default="csv", help="формат файлов с данными")
+        parser.add_argument("--data-dir", default=DIR_DATA, help="каталог с файлами данных")
+        parser.add_argument("--batch-size", type=int, default=1000, help="размер пакета для вставки")
+        parser.add_argument(
+            "--mode",
+            choices=["insert", "skip", "upsert"],
+            default="skip",
+            help="insert - только в пустую таблицу, skip - пропускать дубликаты, upsert - обновлять дубликаты",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="разобрать файлы без записи в базу")
 
     def handle(self, *args, **options):
-        for in_csv in IMPORTS_CSV:
-            file = in_csv["file"]
-            model = in_csv["model"]
-
-            if os.path.exists(DIR_CSV + file):
-                if model.objects.exists() and not in_csv["add"]:
-                    print(
-                        f"данные в таблице {model.__name__} уже существуют! "
-                        f"Вставить записи можно только в пустую таблицу."
-                    )
-                    continue
-
-                with open(DIR_CSV + file, encoding="utf-8") as csvfile:
-                    reader = DictReader(csvfile, delimiter=",")
-                    count = 0
-                    for row in reader:
-                        try:
-                            if in_csv["add"]:
-                                write_m2m_model(
-                                    row,
-                                    model,
-                                    in_csv["m2m_field_parent"],
-                                    in_csv["m2m_field_child"],
-                                )
-                            else:
-                                write_to_model(row, model, in_csv["inst_fields"])
-                            count += 1
-                        except Exception as error:
-                            print(error)
-                    self.stdout.write(f"в таблицу {model.__name__} вставлено " f"{count} записей")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        written = 0
+        for in_data in IMPORTS:
+            path = os.path.join(options["data_dir"], f"{in_data['name']}.{options['format']}")
+            if not os.path.exists(path):
+                self.stderr.write(f"файл {path} не найден")
+                continue
+            written += self.load(in_data, READERS[options["format"]](path), options)
+        if written:
+            bump_catalogue_version()
+
+    def load(self, in_data, rows, options):
+        model = in_data["model"]
+        mode = options["mode"]
+        if mode == "insert" and not in_data["add"] and model.objects.exists():
+            self.stderr.write(
+                f"данные в таблице {model.__name__} уже существуют! "
+                f"Вставить записи можно только в пустую таблицу."
+            )
+            return 0
+
+        fk_maps = get_fk_maps(in_data)
+        unique = in_data.get("unique")
+        existing = get_existing(in_data) if mode != "insert" else {}
+        update_fields = [
+            field.name
+            for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in (unique or ())
+        ]
+        upsert = mode == "upsert" and bool(update_fields)
+
+        stats = {"created": 0, "updated": 0, "skipped": 0, "errors": 0}
+        started = time.monotonic()
+        total = 0
+        for batch in batched(rows, options["batch_size"]):
+            objs, updates = self.split_batch(
+                in_data, enumerate(batch, start=total + 1), fk_maps, existing, upsert, stats
+            )
+            total += len(batch)
+
+            if not options["dry_run"]:
+                with transaction.atomic():
+                    self.write(in_data, objs, updates, update_fields)
+            stats["created"] += len(objs)
+            stats["updated"] += len(updates)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{model.__name__}: обработано {total} строк, {total / max(elapsed, 1e-9):.0f} строк/с")
+
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(
+            f"{prefix}в таблицу {model.__name__} вставлено {stats['created']} записей, "
+            f"обновлено {stats['updated']}, пропущено {stats['skipped']}, ошибок {stats['errors']} "
+            f"за {time.monotonic() - started:.2f} с"
+        )
+        return 0 if options["dry_run"] else stats["created"] + stats["updated"]
+
+    def split_batch(self, in_data, numbered_rows, fk_maps, existing, upsert, stats):
+        """New objects and updates of existing rows, skips and errors are counted in ``stats``."""
+        unique = None if in_data["add"] else in_data.get("unique")
+        objs, updates = [], []
+        for number, row in numbered_rows:
+            try:
+                obj = self.build(in_data, row, fk_maps)
+            except (KeyError, TypeError, ValueError) as error:
+                stats["errors"] += 1
+                if stats["errors"] <= MAX_ERRORS_SHOWN:
+                    self.stderr.write(f"строка {number}: {error!r}")
+                continue
+            key = get_key(row, unique) if unique else None
+            if key is None or key not in existing:
+                if key is not None:
+                    existing[key] = None
+                objs.append(obj)
+            elif upsert and existing[key] is not None:
+                obj.pk = existing[key]
+                updates.append(obj)
+            else:
+                stats["skipped"] += 1
+        return objs, updates
+
+    def build(self, in_data, row, fk_maps):
+        model = in_data["model"]
+        row = dict(row)
+        if in_data["add"]:
+            child = in_data["m2m_field_child"]
+            through = getattr(model, child["field"]).through
+            return through(
+                **{
+                    f"{model._meta.model_name}_id": int(row[in_data["m2m_field_parent"]]),
+                    f"{child['model']._meta.model_name}_id": int(row[child["csv_row"]]),
+                }
+            )
+        for field in in_data["inst_fields"]:
+            value = row.pop(field["csv_row"])
+            if value not in fk_maps[field["field"]]:
+                raise ValueError(f"{field['model'].__name__} {value} не найден")
+            row[f"{field['field']}_id"] = fk_maps[field["field"]][value]
+        return model(**row)
+
+    def write(self, in_data, objs, updates, update_fields):
+        model = in_data["model"]
+        if in_data["add"]:
+            if objs:
+                type(objs[0]).objects.bulk_create(objs, ignore_conflicts=True)
+            return
+        model.objects.bulk_create(objs)
+        if updates:
+            model.objects.bulk_update(updates, update_fields)
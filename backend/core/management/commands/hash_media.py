@@ -0,0 +1,76 @@
+import re
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from core.images import delete_variants
+from core.models import StoredFile
+from foods.models import Recipe
+
+HASHED_NAME = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+class Command(BaseCommand):
+    help = "Перенос картинок рецептов в хранилище с именами по хешу содержимого и пересчёт ссылок на файлы"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="только показать, что будет сделано")
+        parser.add_argument(
+            "--delete-originals", action="store_true", help="удалить перенесённые файлы со старыми именами"
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field("image").storage
+        dry_run = options["dry_run"]
+        renamed, converted, missing = {}, 0, 0
+        recipes = Recipe.objects.exclude(image="").only("id", "image").order_by("id")
+        for recipe in recipes.iterator():
+            old = recipe.image.name
+            if HASHED_NAME.search(old):
+                continue
+            if old not in renamed:
+                if not storage.exists(old):
+                    missing += 1
+                    self.stderr.write(f"рецепт {recipe.id}: файл {old} не найден")
+                    continue
+                renamed[old] = None if dry_run else self.rehash(storage, old)
+            if not dry_run:
+                Recipe.objects.filter(pk=recipe.pk, image=old).update(image=renamed[old], image_variants={})
+            converted += 1
+
+        new_names = {name for name in renamed.values() if name}
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(
+            f"{prefix}перенесено рецептов: {converted}, файлов: {len(renamed)}, "
+            f"уникальных файлов: {len(new_names) if not dry_run else '?'}, не найдено: {missing}"
+        )
+        if dry_run:
+            return
+
+        if options["delete_originals"]:
+            self.delete_originals(storage, renamed)
+        self.rebuild_references()
+        if converted:
+            self.stdout.write("запустите image_variants, чтобы подготовить уменьшенные копии картинок")
+
+    def rehash(self, storage, name):
+        """Save the file under its hashed name and return that name."""
+        with storage.open(name, "rb") as file:
+            return storage.save(name, file)
+
+    def delete_originals(self, storage, renamed):
+        for old in renamed:
+            if not Recipe.objects.filter(image=old).exists():
+                storage.delete(old)
+                delete_variants(storage, old)
+
+    def rebuild_references(self):
+        references = Recipe.objects.exclude(image="").order_by().values("image").annotate(count=Count("id"))
+        with transaction.atomic():
+            StoredFile.objects.all().delete()
+            StoredFile.objects.bulk_create(
+                (StoredFile(name=row["image"], references=row["count"]) for row in references.iterator()),
+                batch_size=1000,
+            )
+        self.stdout.write(f"учтено файлов: {StoredFile.objects.count()}")
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from core.images import generate_variants
+from foods.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Подготовка уменьшенных копий картинок рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="пересоздать копии для всех рецептов")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="").only("id", "image", "image_variants").order_by("id")
+        count = 0
+        for recipe in recipes.iterator():
+            if options["all"] or recipe.image_variants.get("source") != recipe.image.name:
+                generate_variants(recipe.id)
+                count += 1
+        self.stdout.write(f"обработано рецептов: {count}")
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+from django.db import connection
+
+from core.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = "Восстановление полнотекстового индекса рецептов"
+
+    def handle(self, *args, **options):
+        with connection.schema_editor() as schema_editor:
+            install_search_index(schema_editor)
+        self.stdout.write(f"индекс рецептов перестроен ({connection.vendor})")
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from core.shopping_list import rebuild_shopping_lists
+from foods.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = "Пересчёт списков покупок по содержимому корзин"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, nargs="+", dest="users", help="id пользователей, по умолчанию все")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_shopping_lists(options["users"])
+        items = ShoppingListItem.objects.all()
+        if options["users"]:
+            items = items.filter(user_id__in=options["users"])
+        self.stdout.write(f"строк в списках покупок: {items.count()}")
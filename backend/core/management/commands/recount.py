@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from core.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчёт счётчиков избранного, списков покупок, рецептов и подписчиков"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = recount_counters()
+        for counter, rows in drifted.items():
+            self.stdout.write(f"{counter}: исправлено {rows} записей")
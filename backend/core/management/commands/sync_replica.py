@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.replica import REPLICA_DB_ALIAS, has_replica
+
+
+class Command(BaseCommand):
+    help = "Копирование основной SQLite базы в реплику для локальной проверки чтения с реплики"
+
+    def handle(self, *args, **options):
+        if not has_replica():
+            raise CommandError("реплика не настроена, задайте DB_REPLICA_NAME")
+        source, target = connections[DEFAULT_DB_ALIAS], connections[REPLICA_DB_ALIAS]
+        if source.vendor != "sqlite" or target.vendor != "sqlite":
+            raise CommandError("команда работает только с SQLite, реплику PostgreSQL наполняет репликация")
+        source.ensure_connection()
+        target.ensure_connection()
+        source.connection.backup(target.connection)
+        self.stdout.write(f"{source.settings_dict['NAME']} скопирована в {target.settings_dict['NAME']}")
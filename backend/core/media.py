@@ -0,0 +1,67 @@
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from core.images import delete_variants
+from core.models import StoredFile
+
+
+def get_sql_names(connection):
+    qn = connection.ops.quote_name
+    return (
+        qn(StoredFile._meta.db_table),
+        qn(StoredFile._meta.get_field("name").column),
+        qn(StoredFile._meta.get_field("references").column),
+    )
+
+
+def lock_file(name):
+    """Lock the reference count row of a file until the transaction ends.
+
+    The row is created with no references if it does not exist yet.
+    """
+    connection = connections[router.db_for_write(StoredFile)]
+    table, name_column, references = get_sql_names(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({name_column}, {references}) VALUES (%s, 0) "
+            f"ON CONFLICT ({name_column}) DO UPDATE SET {references} = {table}.{references}",
+            [name],
+        )
+
+
+def acquire_file(name):
+    """Count one more record pointing to a stored file with a single upsert."""
+    if not name:
+        return
+    connection = connections[router.db_for_write(StoredFile)]
+    table, name_column, references = get_sql_names(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({name_column}, {references}) VALUES (%s, 1) "
+            f"ON CONFLICT ({name_column}) DO UPDATE SET {references} = {table}.{references} + 1",
+            [name],
+        )
+
+
+def release_file(storage, name, is_referenced):
+    """Drop one reference and delete the file with its variants once unused.
+
+    The count row is locked first, so an upload of the same content waits
+    for the delete to finish and writes the file again. It is locked by
+    the decrement itself: a SELECT FOR UPDATE is a plain read on SQLite,
+    and upgrading it to a write fails while another thread writes.
+    ``is_referenced`` covers files stored before reference counting.
+    """
+    if not name:
+        return
+    using = router.db_for_write(StoredFile)
+    files = StoredFile.objects.using(using).filter(name=name)
+    with transaction.atomic(using=using):
+        files.update(references=F("references") - 1)
+        references = files.values_list("references", flat=True).first()
+        if references is not None and references > 0:
+            return
+        files.delete()
+        if not is_referenced(name):
+            storage.delete(name)
+            delete_variants(storage, name)
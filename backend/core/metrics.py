@@ -0,0 +1,263 @@
+"""In-process metrics exported in the Prometheus text format.
+
+Every process keeps its own counters and histograms, guarded by a lock for
+its threads. gunicorn runs several worker processes, so with ``METRICS_DIR``
+set each of them writes a snapshot to ``<pid>-<start time>.json`` in that
+directory, at most every ``METRICS_FLUSH_INTERVAL`` seconds, and ``collect``
+sums the snapshots of all workers. The start time keeps a worker that gets
+a reused pid from overwriting the file of an exited one. ``collect`` folds
+the files of exited workers into ``retired.json``, so counters never go
+down; the directory is emptied on deploy by ``infra/entrypoint.sh``.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_DIR = getattr(settings, "METRICS_DIR", "")
+FLUSH_INTERVAL = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+RETIRED = "retired"
+
+
+class Metric:
+    """Thread-safe metric with one series per value of an optional label."""
+
+    type = None
+
+    def __init__(self, name, documentation, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def copy_value(self, value):
+        return value
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            series = [[key, self.copy_value(value)] for key, value in self.series.items()]
+        return {"type": self.type, "documentation": self.documentation, "label": self.label, "series": series}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, label_value=None):
+        with self.lock:
+            self.series[label_value] = self.series.get(label_value, 0) + amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, label=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, label_value=None):
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            if position < len(self.buckets):
+                series["buckets"][position] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def copy_value(self, value):
+        return dict(value, buckets=list(value["buckets"]))
+
+    def snapshot(self) -> dict:
+        return dict(super().snapshot(), buckets=list(self.buckets))
+
+
+REGISTRY = {}
+
+
+def register(metric):
+    REGISTRY[metric.name] = metric
+    return metric
+
+
+def get_snapshot() -> dict:
+    return {name: metric.snapshot() for name, metric in REGISTRY.items()}
+
+
+def merge(snapshots) -> dict:
+    """Sum the series of several snapshots, keyed by label value."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, series={}))
+            for label_value, value in metric["series"]:
+                current = target["series"].get(label_value)
+                if current is None:
+                    target["series"][label_value] = value
+                elif metric["type"] == "counter":
+                    target["series"][label_value] = current + value
+                elif metric.get("buckets") == target.get("buckets"):
+                    target["series"][label_value] = {
+                        "buckets": [a + b for a, b in zip(current["buckets"], value["buckets"])],
+                        "count": current["count"] + value["count"],
+                        "sum": current["sum"] + value["sum"],
+                    }
+    return merged
+
+
+def get_start_time(pid):
+    """Start time of a process in clock ticks since boot, None without ``/proc``."""
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            stat = file.read()
+    except OSError:
+        return None
+    # The command name in parentheses may contain spaces, the fields after it do not.
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+_process = None
+
+
+def get_process_id() -> str:
+    """Name of this process' snapshot, computed again in a forked worker."""
+    global _process
+    pid = os.getpid()
+    if _process is None or _process[0] != pid:
+        _process = (pid, f"{pid}-{get_start_time(pid) or uuid.uuid4().hex}")
+    return _process[1]
+
+
+def is_exited(process_id) -> bool:
+    """Whether the process that wrote a snapshot is gone; unknown without ``/proc``."""
+    pid, _, start = process_id.partition("-")
+    if not pid.isdigit() or get_start_time(os.getpid()) is None:
+        return False
+    return get_start_time(int(pid)) != start
+
+
+def write_snapshot(name, snapshot):
+    descriptor, path = tempfile.mkstemp(dir=METRICS_DIR, suffix=".tmp")
+    with os.fdopen(descriptor, "w") as file:
+        json.dump(snapshot, file)
+    os.replace(path, os.path.join(METRICS_DIR, f"{name}.json"))
+
+
+def read_snapshots():
+    """``{name: snapshot}`` of the files in ``METRICS_DIR``."""
+    snapshots = {}
+    for entry in os.scandir(METRICS_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as file:
+                snapshots[os.path.splitext(entry.name)[0]] = json.load(file)
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+@contextmanager
+def directory_lock():
+    """Serialize ``collect`` between the workers, a no-op without ``fcntl``."""
+    if fcntl is None:
+        yield False
+        return
+    with open(os.path.join(METRICS_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield True
+
+
+def retire(snapshots) -> dict:
+    """Fold the snapshots of exited workers into ``retired.json``."""
+    exited = [name for name in snapshots if name != RETIRED and is_exited(name)]
+    if not exited:
+        return snapshots
+    merged = merge([snapshots.get(RETIRED, {})] + [snapshots[name] for name in exited])
+    retired = {name: dict(metric, series=list(metric["series"].items())) for name, metric in merged.items()}
+    write_snapshot(RETIRED, retired)
+    for name in exited:
+        os.remove(os.path.join(METRICS_DIR, f"{name}.json"))
+        del snapshots[name]
+    snapshots[RETIRED] = retired
+    return snapshots
+
+
+_last_flush = 0.0
+
+
+def flush(force=False):
+    """Write the snapshot of this process to ``METRICS_DIR``, if it is set."""
+    global _last_flush
+    now = time.monotonic()
+    if not METRICS_DIR or (not force and now - _last_flush < FLUSH_INTERVAL):
+        return
+    _last_flush = now
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    write_snapshot(get_process_id(), get_snapshot())
+
+
+def collect() -> dict:
+    """Metrics of all workers, or of this process without ``METRICS_DIR``."""
+    if not METRICS_DIR:
+        return merge([get_snapshot()])
+    flush(force=True)
+    # Under the lock, so that no reader sees an exited worker both in its
+    # own file and in retired.json.
+    with directory_lock() as locked:
+        snapshots = read_snapshots()
+        if locked:
+            snapshots = retire(snapshots)
+    return merge(snapshots.values())
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + "}"
+
+
+def to_prometheus_text(metrics) -> str:
+    lines = []
+    for name, metric in sorted(metrics.items()):
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for label_value, value in sorted(metric["series"].items(), key=lambda item: str(item[0])):
+            labels = [] if metric["label"] is None else [(metric["label"], label_value)]
+            if metric["type"] == "counter":
+                lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+            total = 0
+            for bound, count in zip(metric["buckets"], value["buckets"]):
+                total += count
+                lines.append(f"{name}_bucket{format_labels(labels + [('le', float(bound))])} {total}")
+            lines.append(f"{name}_bucket{format_labels(labels + [('le', '+Inf')])} {value['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+db_connection_acquire_seconds = register(
+    Histogram(
+        "db_connection_acquire_seconds",
+        "Время получения соединения с БД: новое подключение или соединение из пула",
+        label="alias",
+    )
+)
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:59
+
+from django.db import migrations, models
+import time
+
+
+def create_version(apps, schema_editor):
+    CatalogueVersion = apps.get_model('core', 'CatalogueVersion')
+    CatalogueVersion.objects.using(schema_editor.connection.alias).create(pk=1, version=time.time_ns())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=time.time_ns, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия каталога',
+                'verbose_name_plural': 'Версии каталога',
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+import time
+
+from django.db import models
+
+
+class StoredFile(models.Model):
+    name = models.CharField("Имя файла", max_length=255, unique=True)
+    references = models.PositiveIntegerField("Количество ссылок", default=0)
+
+    class Meta:
+        verbose_name = "Файл"
+        verbose_name_plural = "Файлы"
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+
+class CatalogueVersion(models.Model):
+    # Starts from the current time, so a recreated row never repeats a version
+    # that a client may still hold in an ETag.
+    version = models.BigIntegerField("Версия", default=time.time_ns)
+
+    class Meta:
+        verbose_name = "Версия каталога"
+        verbose_name_plural = "Версии каталога"
+
+    def __str__(self):
+        return str(self.version)
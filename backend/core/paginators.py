@@ -0,0 +1,59 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = 100_000
+COUNT_CACHE_TIMEOUT = getattr(settings, "PAGINATION_COUNT_TIMEOUT", 30)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner's row estimate for big tables.
+
+    On PostgreSQL an unfiltered queryset over a table with more than
+    ``ESTIMATE_THRESHOLD`` rows is counted from ``pg_class.reltuples``
+    instead of a full ``COUNT(*)``. Everything else is counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[getattr(queryset, "db", "default")]
+        if connection.vendor == "postgresql" and hasattr(queryset, "query") and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATE_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that keeps ``COUNT(*)`` results in the cache for a while.
+
+    The key is built from the SQL of the queryset, so different filters and
+    users get their own counts. Nothing drops a count when rows change, so
+    it may lag by up to ``count_timeout`` seconds.
+    """
+
+    count_timeout = COUNT_CACHE_TIMEOUT
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, "query"):
+            return super().count
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = "count:" + hashlib.md5(f"{sql}{params!r}".encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, self.count_timeout)
+        return count
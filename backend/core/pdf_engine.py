@@ -1,5 +1,10 @@
+import hashlib
 import io
+import json
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 
 from django.conf import settings
 from django.http import FileResponse
@@ -13,13 +18,15 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
 from reportlab.platypus.paragraph import Paragraph
 
+PDF_CACHE_SIZE = getattr(settings, "SHOPPING_CART_PDF_CACHE_SIZE", 128)
 
-def get_shopping_cart_pdf(data: list):
-    styles = getSampleStyleSheet()
-    styles["Heading1"].fontName = "DejaVuSansMono"
-    styles["Heading2"].fontName = "DejaVuSansMono"
-    styles["Normal"].fontName = "DejaVuSansMono"
+_pdf_cache = OrderedDict()
+_pdf_cache_lock = threading.Lock()
 
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """Register the font and build the style sheet once per process."""
     registerFont(
         TTFont(
             "DejaVuSansMono",
@@ -27,6 +34,37 @@ def get_shopping_cart_pdf(data: list):
             "UTF-8",
         )
     )
+    styles = getSampleStyleSheet()
+    styles["Heading1"].fontName = "DejaVuSansMono"
+    styles["Heading2"].fontName = "DejaVuSansMono"
+    styles["Normal"].fontName = "DejaVuSansMono"
+    return styles
+
+
+def get_shopping_cart_pdf(data: list):
+    """Return the shopping list as a PDF attachment.
+
+    Rendered documents are kept in a per-process LRU cache keyed by a hash of
+    the rows and the current date. The "Сформирован" line shows the date only,
+    so a cart that has not changed during the day is served from the cache.
+    """
+    today = datetime.today().strftime("%d/%m/%Y")
+    key = hashlib.sha256(json.dumps([today, data], ensure_ascii=False).encode()).hexdigest()
+    with _pdf_cache_lock:
+        content = _pdf_cache.get(key)
+        if content is not None:
+            _pdf_cache.move_to_end(key)
+    if content is None:
+        content = render_shopping_cart_pdf(data, today)
+        with _pdf_cache_lock:
+            _pdf_cache[key] = content
+            while len(_pdf_cache) > PDF_CACHE_SIZE:
+                _pdf_cache.popitem(last=False)
+    return FileResponse(io.BytesIO(content), as_attachment=True, filename="shopping_cart.pdf")
+
+
+def render_shopping_cart_pdf(data: list, date: str) -> bytes:
+    styles = get_styles()
 
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(
@@ -49,7 +87,7 @@ def get_shopping_cart_pdf(data: list):
 
     story.append(
         Paragraph(
-            "Сформирован: " + datetime.today().strftime("%d/%m/%Y %H:%M"),
+            "Сформирован: " + date,
             styles["Normal"],
         )
     )
@@ -87,6 +125,4 @@ def get_shopping_cart_pdf(data: list):
     )
 
     doc.build(story)
-    buffer.seek(0)
-
-    return FileResponse(buffer, as_attachment=True, filename="shopping_cart.pdf")
+    return buffer.getvalue()
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.caching import is_cache_shared
+
+RELATIONS_TIMEOUT = getattr(settings, "RELATIONS_CACHE_TIMEOUT", 60 * 60)
+
+RELATIONS = {
+    "favorites": ("foods.Favorite", "recipe_id"),
+    "cart": ("foods.ShoppingCart", "recipe_id"),
+    "subscriptions": ("foods.Subscription", "author_id"),
+}
+
+
+def get_key(user_id, name):
+    return f"relations:{user_id}:{name}"
+
+
+def load_relations(user_id) -> dict:
+    """Return the favourite, cart and followed author id sets of a user.
+
+    All sets are read with one ``get_many``, the missing ones are loaded from
+    the database and written back. A toggle only clears the cache it can
+    reach, so with a per-process cache the sets are always loaded.
+    """
+    from django.apps import apps
+
+    shared = is_cache_shared()
+    keys = {name: get_key(user_id, name) for name in RELATIONS}
+    cached = cache.get_many(keys.values()) if shared else {}
+    relations, missing = {}, {}
+    for name, key in keys.items():
+        if key in cached:
+            relations[name] = cached[key]
+            continue
+        model, field = RELATIONS[name]
+        model = apps.get_model(model)
+        # Cached for a long time, so it is read from the primary even on replica requests.
+        rows = model.objects.using(router.db_for_write(model)).filter(user_id=user_id)
+        relations[name] = set(rows.values_list(field, flat=True))
+        missing[key] = relations[name]
+    if missing and shared:
+        cache.set_many(missing, RELATIONS_TIMEOUT)
+    return relations
+
+
+def get_user_relations(request) -> dict:
+    """Relations of the requesting user, loaded once per request."""
+    relations = getattr(request, "_user_relations", None)
+    if relations is None:
+        relations = load_relations(request.user.id)
+        request._user_relations = relations
+    return relations
+
+
+def invalidate_relations(user_id, *names):
+    cache.delete_many([get_key(user_id, name) for name in names or RELATIONS])
+
+
+def get_relation_sql(model, values, connection):
+    qn = connection.ops.quote_name
+    columns = [qn(model._meta.get_field(name).column) for name in values]
+    return qn(model._meta.db_table), columns, qn(model._meta.pk.column)
+
+
+def can_return_rows(connection) -> bool:
+    # RETURNING on INSERT and DELETE, SQLite has it since 3.35.
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == "postgresql"
+
+
+def get_instances(model, pks, values):
+    attrs = {model._meta.get_field(name).attname: value for name, value in values.items()}
+    return [model(pk=pk, **attrs) for pk in pks]
+
+
+def add_relation(model, **values) -> bool:
+    """Insert a (user, recipe/author) row with ``ON CONFLICT DO NOTHING``.
+
+    Returns whether a row was inserted. ``post_save`` is sent by hand with
+    the inserted row, so that the counters, shopping lists and the relation
+    cache stay in sync.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    table, columns, pk_column = get_relation_sql(model, values, connection)
+    returning = can_return_rows(connection)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) ON CONFLICT DO NOTHING"
+    )
+    if returning:
+        sql += f" RETURNING {pk_column}"
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, list(values.values()))
+            if returning:
+                pks = [row[0] for row in cursor.fetchall()]
+            elif cursor.rowcount > 0:
+                pks = list(model.objects.using(using).filter(**values).values_list("pk", flat=True))
+            else:
+                pks = []
+        for instance in get_instances(model, pks, values):
+            post_save.send(model, instance=instance, created=True, update_fields=None, raw=False, using=using)
+    return bool(pks)
+
+
+def remove_relation(model, **values) -> bool:
+    """Delete a (user, recipe/author) row with a single DELETE.
+
+    ``post_delete`` is sent by hand with the deleted row.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    table, columns, pk_column = get_relation_sql(model, values, connection)
+    returning = can_return_rows(connection)
+    where = " AND ".join(f"{column} = %s" for column in columns)
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            if returning:
+                cursor.execute(f"DELETE FROM {table} WHERE {where} RETURNING {pk_column}", list(values.values()))
+                pks = [row[0] for row in cursor.fetchall()]
+            else:
+                pks = list(model.objects.using(using).select_for_update().filter(**values).values_list("pk", flat=True))
+                if pks:
+                    cursor.execute(f"DELETE FROM {table} WHERE {where}", list(values.values()))
+        for instance in get_instances(model, pks, values):
+            post_delete.send(model, instance=instance, using=using)
+    return bool(pks)
@@ -0,0 +1,89 @@
+"""Optional read replica.
+
+With a ``replica`` alias in ``DATABASES`` the viewsets marked with
+``ReplicaReadMixin`` run their safe-method queries on the replica, anything
+else stays on ``default``. A user who has just written is pinned to the
+primary for ``REPLICA_PIN_SECONDS``, so replication lag never hides their
+own changes. The pin is kept in the cache, which must be shared: nginx
+sends the write and the reads that follow to different worker processes.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+from core.caching import is_cache_shared
+
+REPLICA_DB_ALIAS = "replica"
+PIN_SECONDS = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+def has_replica() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def get_pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    cache.set(get_pin_key(user_id), True, PIN_SECONDS)
+
+
+def is_pinned(user_id) -> bool:
+    return cache.get(get_pin_key(user_id), False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # DatabaseCache entries are written to the primary and must be read back from it.
+        if model._meta.app_label == "django_cache":
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS if read_from_replica.get() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema and data from the primary.
+        return db != REPLICA_DB_ALIAS
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """Pin users that changed something to the primary for a while.
+
+    DRF authenticates inside the view and copies the user to the Django
+    request, so it is known here once the response is ready.
+    """
+
+    def __init__(self, get_response):
+        if not has_replica():
+            raise MiddlewareNotUsed
+        if not is_cache_shared():
+            raise ImproperlyConfigured("Реплике нужен общий для всех воркеров кеш, задайте CACHE_BACKEND")
+        super().__init__(get_response)
+
+    def process_response(self, request, response):
+        user = getattr(request, "user", None)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and user and user.is_authenticated:
+            pin_to_primary(user.pk)
+        return response
@@ -0,0 +1,140 @@
+"""Per-view request metrics and the ``Server-Timing`` header.
+
+``RequestMetricsMiddleware`` keeps the counters of the current request in a
+context variable, so they follow the request into the thread pool of the
+async read path. SQL queries are counted by an execute wrapper installed on
+every new connection, render time is reported by ``FastJSONRenderer``.
+Per resolved view the middleware records the latency histogram, SQL
+queries and their time, render time and response bytes as sent, after
+compression; ``SERVER_TIMING`` adds the same numbers to the response.
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from core.metrics import Counter, Histogram, flush, register
+
+SERVER_TIMING = getattr(settings, "SERVER_TIMING", True)
+
+current_request = ContextVar("current_request", default=None)
+
+request_duration_seconds = register(
+    Histogram("http_request_duration_seconds", "Время обработки запроса", label="view")
+)
+request_db_queries = register(Counter("http_request_db_queries_total", "Запросы к БД", label="view"))
+request_db_seconds = register(Counter("http_request_db_seconds_total", "Время запросов к БД", label="view"))
+request_render_seconds = register(
+    Counter("http_request_render_seconds_total", "Время сериализации ответа в JSON", label="view")
+)
+response_bytes = register(Counter("http_response_bytes_total", "Размер отданных ответов", label="view"))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "render_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_render(seconds):
+    stats = current_request.get()
+    if stats is not None:
+        stats.render_seconds += seconds
+
+
+def get_view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    view = match.func
+    actions = getattr(view, "actions", None)
+    name = getattr(view, "cls", view).__name__
+    if actions:
+        method = request.method.lower()
+        action = actions.get(method) or (actions.get("get") if method == "head" else None)
+        if action:
+            return f"{name}.{action}"
+    return name
+
+
+def count_streamed_bytes(content, view):
+    sent = 0
+    try:
+        for chunk in content:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        response_bytes.inc(sent, view)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Served as a coroutine under ASGI, without a thread hop.
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    def record(self, request, response, stats, seconds):
+        view = get_view_name(request)
+        request_duration_seconds.observe(seconds, view)
+        request_db_queries.inc(stats.queries, view)
+        request_db_seconds.inc(stats.db_seconds, view)
+        request_render_seconds.inc(stats.render_seconds, view)
+        if response.streaming:
+            response.streaming_content = count_streamed_bytes(response.streaming_content, view)
+        else:
+            response_bytes.inc(len(response.content), view)
+        if SERVER_TIMING:
+            response["Server-Timing"] = (
+                f"total;dur={seconds * 1000:.1f}, "
+                f'db;dur={stats.db_seconds * 1000:.1f};desc="queries: {stats.queries}", '
+                f"render;dur={stats.render_seconds * 1000:.1f}"
+            )
+        flush()
+        return response
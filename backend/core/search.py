@@ -0,0 +1,178 @@
+"""Full-text search over recipe names and descriptions.
+
+The index lives in the database and is kept in sync by triggers, so bulk
+inserts and queryset updates are covered as well:
+
+* PostgreSQL: a ``search_vector`` tsvector column on ``foods_recipe`` with
+  Russian stemming (name weighted above text) and a GIN index;
+* SQLite: an external content FTS5 table ``foods_recipe_fts``.
+
+Other backends fall back to ``icontains``.
+
+A migration that rebuilds ``foods_recipe`` on SQLite drops its triggers with
+the old table. ``repair_search_index`` runs after every ``migrate`` and
+reinstalls the index when a trigger is missing.
+"""
+import logging
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = "russian"
+
+POSTGRESQL_INSTALL = [
+    "ALTER TABLE foods_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    f"""
+    CREATE OR REPLACE FUNCTION foods_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS foods_recipe_search_vector_update ON foods_recipe",
+    """
+    CREATE TRIGGER foods_recipe_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, text ON foods_recipe
+    FOR EACH ROW EXECUTE PROCEDURE foods_recipe_search_vector()
+    """,
+    "UPDATE foods_recipe SET name = name",
+    "CREATE INDEX IF NOT EXISTS foods_recipe_search_vector_idx ON foods_recipe USING GIN (search_vector)",
+]
+
+POSTGRESQL_UNINSTALL = [
+    "DROP INDEX IF EXISTS foods_recipe_search_vector_idx",
+    "DROP TRIGGER IF EXISTS foods_recipe_search_vector_update ON foods_recipe",
+    "DROP FUNCTION IF EXISTS foods_recipe_search_vector()",
+    "ALTER TABLE foods_recipe DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS foods_recipe_fts USING fts5(
+        name, text, content='foods_recipe', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS foods_recipe_fts_insert AFTER INSERT ON foods_recipe BEGIN
+        INSERT INTO foods_recipe_fts(rowid, name, text) VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS foods_recipe_fts_delete AFTER DELETE ON foods_recipe BEGIN
+        INSERT INTO foods_recipe_fts(foods_recipe_fts, rowid, name, text) VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS foods_recipe_fts_update AFTER UPDATE OF name, text ON foods_recipe BEGIN
+        INSERT INTO foods_recipe_fts(foods_recipe_fts, rowid, name, text) VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO foods_recipe_fts(rowid, name, text) VALUES (new.id, new.name, new.text);
+    END
+    """,
+    "INSERT INTO foods_recipe_fts(foods_recipe_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS foods_recipe_fts_insert",
+    "DROP TRIGGER IF EXISTS foods_recipe_fts_delete",
+    "DROP TRIGGER IF EXISTS foods_recipe_fts_update",
+    "DROP TABLE IF EXISTS foods_recipe_fts",
+]
+
+STATEMENTS = {
+    "postgresql": (POSTGRESQL_INSTALL, POSTGRESQL_UNINSTALL),
+    "sqlite": (SQLITE_INSTALL, SQLITE_UNINSTALL),
+}
+
+TRIGGERS = {
+    "postgresql": (
+        "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal AND tgname IN ({})",
+        ["foods_recipe_search_vector_update"],
+    ),
+    "sqlite": (
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN ({})",
+        ["foods_recipe_fts_insert", "foods_recipe_fts_delete", "foods_recipe_fts_update"],
+    ),
+}
+SEARCH_MIGRATION = ("foods", "0011_recipe_search")
+
+
+def install_search_index(schema_editor):
+    """Create or repair the index and reindex all recipes.
+
+    Safe to run again, e.g. after a migration rebuilt ``foods_recipe`` on
+    SQLite and dropped the triggers with the old table.
+    """
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ((), ()))[0]:
+        schema_editor.execute(statement)
+
+
+def uninstall_search_index(schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ((), ()))[1]:
+        schema_editor.execute(statement)
+
+
+def get_missing_triggers(connection) -> set:
+    if connection.vendor not in TRIGGERS:
+        return set()
+    sql, names = TRIGGERS[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(", ".join(["%s"] * len(names))), names)
+        return set(names) - {row[0] for row in cursor.fetchall()}
+
+
+def repair_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """``post_migrate`` receiver that reinstalls an index missing its triggers."""
+    connection = connections[using]
+    if SEARCH_MIGRATION not in MigrationRecorder(connection).applied_migrations():
+        return
+    missing = get_missing_triggers(connection)
+    if not missing:
+        return
+    with connection.schema_editor() as schema_editor:
+        install_search_index(schema_editor)
+    logger.warning("Восстановлен полнотекстовый индекс рецептов, не было триггеров: %s", ", ".join(sorted(missing)))
+
+
+def get_fts5_query(query):
+    # Each word becomes a quoted prefix term, FTS5 operators in the input are
+    # matched as plain text. Prefixes stand in for the missing stemmer.
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def search_recipes(queryset, query):
+    """Filter recipes by ``query`` and order them by relevance, best first.
+
+    The relevance goes before the queryset ordering, which is kept to break
+    ties. Cursor pagination orders by its keyset and ignores the relevance.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        matches = RawSQL(f"SELECT id FROM foods_recipe WHERE search_vector @@ {tsquery}", [query])
+        rank = RawSQL(f"-ts_rank(foods_recipe.search_vector, {tsquery})", [query], output_field=FloatField())
+    elif vendor == "sqlite":
+        match = get_fts5_query(query)
+        if not match:
+            return queryset.none()
+        matches = RawSQL("SELECT rowid FROM foods_recipe_fts WHERE foods_recipe_fts MATCH %s", [match])
+        # bm25() is lower for better matches.
+        rank = RawSQL(
+            "(SELECT bm25(foods_recipe_fts, 10.0, 1.0) FROM foods_recipe_fts "
+            "WHERE foods_recipe_fts MATCH %s AND rowid = foods_recipe.id)",
+            [match],
+            output_field=FloatField(),
+        )
+    else:
+        return queryset.filter(Q(name__icontains=query) | Q(text__icontains=query))
+    return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by("search_rank", *queryset.query.order_by)
@@ -0,0 +1,100 @@
+import logging
+
+from django.db import connections, router
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from foods.models import IngredientRecipe, ShoppingCart, ShoppingListItem
+
+logger = logging.getLogger(__name__)
+
+
+def get_table_names(connection):
+    qn = connection.ops.quote_name
+    return {
+        "item": qn(ShoppingListItem._meta.db_table),
+        "cart": qn(ShoppingCart._meta.db_table),
+        "ingredients": qn(IngredientRecipe._meta.db_table),
+    }
+
+
+def insert_totals(where, params, upsert=True):
+    """Insert per (user, ingredient) totals of carted recipes matching ``where``."""
+    connection = connections[router.db_for_write(ShoppingListItem)]
+    tables = get_table_names(connection)
+    sql = (
+        "INSERT INTO {item} (user_id, ingredient_id, amount) "
+        "SELECT cart.user_id, ingredients.ingredients_id, SUM(ingredients.amount) "
+        "FROM {cart} cart INNER JOIN {ingredients} ingredients ON ingredients.recipe_id = cart.recipe_id "
+        f"WHERE {where} GROUP BY cart.user_id, ingredients.ingredients_id"
+    ).format(**tables)
+    if upsert:
+        sql += f" ON CONFLICT (user_id, ingredient_id) DO UPDATE SET amount = {tables['item']}.amount + EXCLUDED.amount"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def add_to_shopping_lists(recipe_id, user_id=None):
+    """Add the ingredients of a recipe to the lists of the users who carted it.
+
+    Without ``user_id`` every cart holding the recipe is updated, this is used
+    after the ingredients of a recipe were changed.
+    """
+    if user_id is None:
+        insert_totals("cart.recipe_id = %s", [recipe_id])
+    else:
+        insert_totals("cart.recipe_id = %s AND cart.user_id = %s", [recipe_id, user_id])
+
+
+def is_carted(recipe_id) -> bool:
+    return ShoppingCart.objects.filter(recipe_id=recipe_id).exists()
+
+
+def subtract_from_shopping_lists(recipe_id, user_id=None):
+    """Take the ingredients of a recipe out of the shopping lists.
+
+    Must run while the recipe ingredients still exist. Without ``user_id`` the
+    users that have the recipe in the cart are updated. Lists holding less
+    than the recipe adds to them have drifted from the carts, they are
+    rebuilt without the recipe instead.
+    """
+    recipe_ingredients = IngredientRecipe.objects.filter(recipe_id=recipe_id)
+    items = ShoppingListItem.objects.filter(ingredient_id__in=recipe_ingredients.values("ingredients_id"))
+    if user_id is None:
+        items = items.filter(user_id__in=ShoppingCart.objects.filter(recipe_id=recipe_id).values("user_id"))
+    else:
+        items = items.filter(user_id=user_id)
+    totals = (
+        recipe_ingredients.filter(ingredients_id=OuterRef("ingredient_id"))
+        .order_by()
+        .values("ingredients_id")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    drifted = set(items.filter(amount__lt=Subquery(totals)).values_list("user_id", flat=True))
+    if drifted:
+        logger.warning("Списки покупок разошлись с корзинами, пересчёт для пользователей %s", sorted(drifted))
+        rebuild_shopping_lists(drifted, exclude_recipe_id=recipe_id)
+        items = items.exclude(user_id__in=drifted)
+    if items.update(amount=F("amount") - Subquery(totals)):
+        items.filter(amount=0).delete()
+
+
+def rebuild_shopping_lists(user_ids=None, exclude_recipe_id=None):
+    """Recalculate the shopping lists from the carts, for all or some users.
+
+    ``exclude_recipe_id`` leaves one recipe out, as if it was not carted.
+    """
+    items = ShoppingListItem.objects.all()
+    where, params = ["1 = 1"], []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        items = items.filter(user_id__in=user_ids)
+        where.append(f"cart.user_id IN ({', '.join(['%s'] * len(user_ids))})")
+        params.extend(user_ids)
+    if exclude_recipe_id is not None:
+        where.append("cart.recipe_id <> %s")
+        params.append(exclude_recipe_id)
+    items.delete()
+    insert_totals(" AND ".join(where), params, upsert=False)
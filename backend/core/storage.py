@@ -0,0 +1,78 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def get_content_hash(content) -> str:
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def get_hashed_name(name, content_hash, depth=2, width=2) -> str:
+    """``recipes/x.jpg`` -> ``recipes/ab/cd/abcd....jpg``."""
+    shards = [content_hash[i * width:(i + 1) * width] for i in range(depth)]
+    extension = os.path.splitext(name)[1].lower()
+    return "/".join(filter(None, [os.path.dirname(name), *shards, content_hash + extension]))
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    """File system storage that names files by the sha256 of their content.
+
+    Identical uploads end up under the same name and only the first one is
+    written to disk. Several records may point to the same file, so callers
+    must not delete files directly, see ``core.media.release_file``.
+
+    The reference count row of the name stays locked from the existence
+    check to the end of the transaction, so a concurrent release cannot
+    delete the file in between. Concurrent writes of the same content are
+    renamed over each other instead of getting suffixed names.
+    """
+
+    def save(self, name, content, max_length=None):
+        from core.media import lock_file
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = get_hashed_name(self.generate_filename(name), get_content_hash(content))
+        lock_file(name)
+        if not self.exists(name):
+            self.write(name, content)
+        return name
+
+    def write(self, name, content):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, mode=self.directory_permissions_mode or 0o777, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            # mkstemp creates the file readable by the owner only.
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def save_derived(self, name, content):
+        """Write a file derived from a hashed one (e.g. a thumbnail) as is."""
+        if self.exists(name):
+            self.delete(name)
+        return super().save(name, content)
+
+
+recipe_image_storage = HashedStorage()
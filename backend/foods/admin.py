@@ -1,5 +1,9 @@
 from django.contrib import admin
 
+from core.paginators import EstimatedCountPaginator
+from core.shopping_list import (add_to_shopping_lists, is_carted,
+                                subtract_from_shopping_lists)
+
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
                      ShoppingCart, Subscription, Tag)
 
@@ -7,27 +11,72 @@ from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
 class IngreditntsDetailsInline(admin.StackedInline):
     model = IngredientRecipe
     min_num = 1
+    autocomplete_fields = ("ingredients",)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ("name", "author", "number_favorites")
-    search_fields = ("author", "name")
-    list_filter = ("author", "tags")
+    search_fields = ("name", "author__username", "author__email")
+    list_filter = ("tags",)
+    autocomplete_fields = ("author",)
     inlines = [IngreditntsDetailsInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("author")
+
+    def save_related(self, request, form, formsets, change):
+        carted = change and is_carted(form.instance.pk)
+        if carted:
+            subtract_from_shopping_lists(form.instance.pk)
+        super().save_related(request, form, formsets, change)
+        if carted:
+            add_to_shopping_lists(form.instance.pk)
 
     def number_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     number_favorites.short_description = "Количество в избранном"
+    number_favorites.admin_order_field = "favorites_count"
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ("name", "measurement_unit")
     search_fields = ("name",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ("name", "color", "slug")
+
+
+@admin.register(Favorite, ShoppingCart)
+class UserRecipeAdmin(admin.ModelAdmin):
+    list_display = ("user", "recipe")
+    list_select_related = ("user", "recipe__author")
+    search_fields = ("user__username", "user__email", "recipe__name")
+    autocomplete_fields = ("user", "recipe")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_readonly_fields(self, request, obj=None):
+        # Moving a row to another pair would skip the counter and shopping list upkeep.
+        return ("user", "recipe") if obj else ()
+
 
+@admin.register(Subscription)
+class SubscriptionAdmin(admin.ModelAdmin):
+    list_display = ("user", "author")
+    list_select_related = ("user", "author")
+    search_fields = ("user__username", "user__email", "author__username", "author__email")
+    autocomplete_fields = ("user", "author")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-@admin.register(Tag, Favorite, ShoppingCart, Subscription)
-class FoodsAdmin(admin.ModelAdmin):
-    pass
+    def get_readonly_fields(self, request, obj=None):
+        return ("user", "author") if obj else ()
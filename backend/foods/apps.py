@@ -1,7 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FoodsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "foods"
     verbose_name = "Рецепты"
+
+    def ready(self):
+        from core.search import repair_search_index
+        from foods import signals  # noqa: F401
+
+        post_migrate.connect(repair_search_index, sender=self)
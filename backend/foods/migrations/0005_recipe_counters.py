@@ -0,0 +1,55 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Frozen copy of core.counters.recount_counters as of this migration.
+COUNTERS = [
+    ("foods", "Recipe", "favorites_count", "Favorite", "recipe"),
+    ("foods", "Recipe", "in_carts_count", "ShoppingCart", "recipe"),
+    ("users", "User", "recipes_count", "Recipe", "author"),
+    ("users", "User", "followers_count", "Subscription", "author"),
+]
+
+
+def recount_counters(apps):
+    for app_label, model_name, field, related_name, related_field in COUNTERS:
+        model, related = apps.get_model(app_label, model_name), apps.get_model("foods", related_name)
+        actual = Coalesce(
+            Subquery(
+                related.objects.filter(**{related_field: OuterRef("pk")})
+                .order_by()
+                .values(related_field)
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            0,
+        )
+        model.objects.update(**{field: actual})
+
+
+def fill_counters(apps, schema_editor):
+    recount_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foods", "0004_alter_ingredient_name"),
+        ("users", "0002_user_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество в избранном"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество в списках покупок"),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Frozen copy of core.counters.recount_counters as of this migration.
+COUNTERS = [
+    ("foods", "Recipe", "favorites_count", "Favorite", "recipe"),
+    ("foods", "Recipe", "in_carts_count", "ShoppingCart", "recipe"),
+    ("users", "User", "recipes_count", "Recipe", "author"),
+    ("users", "User", "followers_count", "Subscription", "author"),
+]
+
+
+def recount_counters(apps):
+    for app_label, model_name, field, related_name, related_field in COUNTERS:
+        model, related = apps.get_model(app_label, model_name), apps.get_model("foods", related_name)
+        actual = Coalesce(
+            Subquery(
+                related.objects.filter(**{related_field: OuterRef("pk")})
+                .order_by()
+                .values(related_field)
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            0,
+        )
+        model.objects.update(**{field: actual})
+
+
+RELATIONS = [
+    ("Favorite", "recipe"),
+    ("ShoppingCart", "recipe"),
+    ("Subscription", "author"),
+]
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name, field in RELATIONS:
+        model = apps.get_model("foods", model_name)
+        keep = model.objects.values("user", field).annotate(keep=Min("id")).values("keep")
+        model.objects.exclude(id__in=keep).delete()
+    apps.get_model("foods", "Subscription").objects.filter(user=models.F("author")).delete()
+    recount_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foods", "0005_recipe_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
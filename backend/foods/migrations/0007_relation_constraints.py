@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foods", "0006_remove_duplicate_relations"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["author", "-pub_date"], name="recipe_author_pub_date_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="favorite",
+            constraint=models.UniqueConstraint(fields=("user", "recipe"), name="unique_favorite"),
+        ),
+        migrations.AddConstraint(
+            model_name="shoppingcart",
+            constraint=models.UniqueConstraint(fields=("user", "recipe"), name="unique_shopping_cart"),
+        ),
+        migrations.AddConstraint(
+            model_name="subscription",
+            constraint=models.UniqueConstraint(fields=("user", "author"), name="unique_subscription"),
+        ),
+        migrations.AddConstraint(
+            model_name="subscription",
+            constraint=models.CheckConstraint(
+                check=~models.Q(user=models.F("author")), name="prevent_self_subscription"
+            ),
+        ),
+    ]
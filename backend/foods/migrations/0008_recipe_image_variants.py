@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foods", "0007_relation_constraints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name="Уменьшенные копии картинки"),
+        ),
+    ]
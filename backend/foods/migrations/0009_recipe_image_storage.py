@@ -0,0 +1,19 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:18
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0008_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=core.storage.HashedStorage(), upload_to='recipes/', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+from django.db import migrations
+
+# Frozen copy of the statements in core.search as of this migration.
+SEARCH_CONFIG = "russian"
+
+POSTGRESQL_INSTALL = [
+    "ALTER TABLE foods_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    f"""
+    CREATE OR REPLACE FUNCTION foods_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS foods_recipe_search_vector_update ON foods_recipe",
+    """
+    CREATE TRIGGER foods_recipe_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, text ON foods_recipe
+    FOR EACH ROW EXECUTE PROCEDURE foods_recipe_search_vector()
+    """,
+    "UPDATE foods_recipe SET name = name",
+    "CREATE INDEX IF NOT EXISTS foods_recipe_search_vector_idx ON foods_recipe USING GIN (search_vector)",
+]
+
+POSTGRESQL_UNINSTALL = [
+    "DROP INDEX IF EXISTS foods_recipe_search_vector_idx",
+    "DROP TRIGGER IF EXISTS foods_recipe_search_vector_update ON foods_recipe",
+    "DROP FUNCTION IF EXISTS foods_recipe_search_vector()",
+    "ALTER TABLE foods_recipe DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS foods_recipe_fts USING fts5(
+        name, text, content='foods_recipe', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS foods_recipe_fts_insert AFTER INSERT ON foods_recipe BEGIN
+        INSERT INTO foods_recipe_fts(rowid, name, text) VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS foods_recipe_fts_delete AFTER DELETE ON foods_recipe BEGIN
+        INSERT INTO foods_recipe_fts(foods_recipe_fts, rowid, name, text) VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS foods_recipe_fts_update AFTER UPDATE OF name, text ON foods_recipe BEGIN
+        INSERT INTO foods_recipe_fts(foods_recipe_fts, rowid, name, text) VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO foods_recipe_fts(rowid, name, text) VALUES (new.id, new.name, new.text);
+    END
+    """,
+    "INSERT INTO foods_recipe_fts(foods_recipe_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS foods_recipe_fts_insert",
+    "DROP TRIGGER IF EXISTS foods_recipe_fts_delete",
+    "DROP TRIGGER IF EXISTS foods_recipe_fts_update",
+    "DROP TABLE IF EXISTS foods_recipe_fts",
+]
+
+STATEMENTS = {
+    "postgresql": (POSTGRESQL_INSTALL, POSTGRESQL_UNINSTALL),
+    "sqlite": (SQLITE_INSTALL, SQLITE_UNINSTALL),
+}
+
+
+def install(apps, schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ((), ()))[0]:
+        schema_editor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ((), ()))[1]:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foods", "0010_shopping_list_items"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
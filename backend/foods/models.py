@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
 
+from core.storage import recipe_image_storage
+
 User = get_user_model()
 
 
@@ -38,7 +40,8 @@ class Recipe(models.Model):
         verbose_name="Автор",
     )
     name = models.CharField("Название", max_length=100)
-    image = models.ImageField("Картинка", upload_to="recipes/")
+    image = models.ImageField("Картинка", upload_to="recipes/", storage=recipe_image_storage)
+    image_variants = models.JSONField("Уменьшенные копии картинки", default=dict, blank=True, editable=False)
     text = models.TextField("Описание")
     cooking_time = models.SmallIntegerField(
         "Время приготовления (в минутах)",
@@ -48,17 +51,17 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(Tag, verbose_name="Теги")
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    favorites_count = models.PositiveIntegerField("Количество в избранном", default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField("Количество в списках покупок", default=0, editable=False)
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=["author", "-pub_date"], name="recipe_author_pub_date_idx"),
+        ]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
 
-    def delete(self, *args, **kwargs):
-        storage, path = self.image.storage, self.image.path
-        super(Recipe, self).delete(*args, **kwargs)
-        storage.delete(path)
-
     def __str__(self):
         return f"{self.name} - {self.author}"
 
@@ -106,6 +109,10 @@ class Subscription(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"], name="unique_subscription"),
+            models.CheckConstraint(check=~models.Q(user=models.F("author")), name="prevent_self_subscription"),
+        ]
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
 
@@ -128,6 +135,9 @@ class Favorite(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"], name="unique_favorite"),
+        ]
         verbose_name = "Избранное"
         verbose_name_plural = "Избранное"
 
@@ -150,8 +160,39 @@ class ShoppingCart(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"], name="unique_shopping_cart"),
+        ]
         verbose_name = "Список покупок"
         verbose_name_plural = "Списки покупок"
 
     def __str__(self):
         return f"{self.user} - {self.recipe}"
+
+
+class ShoppingListItem(models.Model):
+    """Ingredient totals of a user's cart, kept in sync by ``core.shopping_list``."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Ингридиент",
+    )
+    amount = models.PositiveIntegerField("Количество")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "ingredient"], name="unique_shopping_list_item"),
+        ]
+        verbose_name = "Продукт в списке покупок"
+        verbose_name_plural = "Список покупок"
+
+    def __str__(self):
+        return f"{self.user} - {self.ingredient}: {self.amount}"
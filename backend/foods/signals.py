@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token, invalidate_user_tokens
+from core.catalogue import bump_catalogue_version
+from core.images import schedule_variants
+from core.media import acquire_file, release_file
+from core.relations import invalidate_relations
+from core.shopping_list import (add_to_shopping_lists, is_carted,
+                                subtract_from_shopping_lists)
+from foods.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                          Subscription, Tag)
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+def update_catalogue_version(sender, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_token(instance.key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_user_tokens(sender, instance, created, **kwargs):
+    # Password changes and deactivation must not wait for the cache timeout.
+    if not created:
+        transaction.on_commit(lambda: invalidate_user_tokens(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+@receiver([post_save, post_delete], sender=Subscription)
+def update_user_relations(sender, instance, **kwargs):
+    name = {Favorite: "favorites", ShoppingCart: "cart", Subscription: "subscriptions"}[sender]
+    transaction.on_commit(lambda: invalidate_relations(instance.user_id, name))
+
+
+COUNTERS = {
+    Favorite: (Recipe, "recipe_id", "favorites_count"),
+    ShoppingCart: (Recipe, "recipe_id", "in_carts_count"),
+    Recipe: (User, "author_id", "recipes_count"),
+    Subscription: (User, "author_id", "followers_count"),
+}
+
+
+def change_counter(sender, instance, delta):
+    model, attname, field = COUNTERS[sender]
+    model.objects.filter(pk=getattr(instance, attname)).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def increment_counter(sender, instance, created, raw=False, **kwargs):
+    # Fixtures are loaded as they are, ``manage.py recount`` fixes the counters after them.
+    if created and not raw:
+        change_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def decrement_counter(sender, instance, **kwargs):
+    change_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image and instance.image_variants.get("source") != instance.image.name:
+        schedule_variants(instance.pk)
+
+
+def is_image_referenced(name):
+    return Recipe.objects.filter(image=name).exists()
+
+
+def release_image(storage, name):
+    transaction.on_commit(lambda: release_file(storage, name, is_image_referenced))
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    # Deferred images are not loaded here, they cannot be changed either.
+    image = instance.__dict__.get("image")
+    instance._stored_image = getattr(image, "name", image)
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_references(sender, instance, created, raw=False, **kwargs):
+    old, new = None if created else instance._stored_image, instance.image.name
+    if raw or old == new:
+        return
+    acquire_file(new)
+    if old:
+        release_image(instance.image.storage, old)
+    instance._stored_image = new
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    release_image(instance.image.storage, instance.image.name)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_to_shopping_lists(instance.recipe_id, instance.user_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def subtract_from_shopping_list(sender, instance, **kwargs):
+    # A no-op when the whole recipe is deleted: its ingredients are gone by now
+    # and the lists were updated in ``subtract_deleted_recipe``.
+    subtract_from_shopping_lists(instance.recipe_id, instance.user_id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def subtract_deleted_recipe(sender, instance, **kwargs):
+    if is_carted(instance.pk):
+        subtract_from_shopping_lists(instance.pk)
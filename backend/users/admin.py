@@ -2,13 +2,17 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
 
+from core.paginators import EstimatedCountPaginator
+
 from .models import User
 
 
 @admin.register(User)
 class MyAdmin(UserAdmin):
-    search_fields = ("email", "first_name")
-    list_display = ("username", "first_name", "last_name", "email")
+    search_fields = ("username", "email", "first_name")
+    list_display = ("username", "first_name", "last_name", "email", "recipes_count", "followers_count")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.unregister(Group)
@@ -6,9 +6,8 @@ class User(AbstractUser):
     email = models.CharField("Электронная почта", max_length=254)
     first_name = models.CharField("Имя", max_length=150)
     last_name = models.CharField("Фамилия", max_length=150)
-
-    def recipes_count(self):
-        return self.recipes.all().count()
+    recipes_count = models.PositiveIntegerField("Количество рецептов", default=0, editable=False)
+    followers_count = models.PositiveIntegerField("Количество подписчиков", default=0, editable=False)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
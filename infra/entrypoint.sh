@@ -6,6 +6,17 @@ python manage.py migrate
 python manage.py createcachetable
 python manage.py collectstatic  --noinput
 python manage.py loaddata db.json
+python manage.py recount
+python manage.py hash_media
+python manage.py rebuild_shopping_lists
+if [ -n "$METRICS_DIR" ]; then
+    # Counters of the previous run are not carried over.
+    rm -rf "$METRICS_DIR" && mkdir -p "$METRICS_DIR"
+fi
+if [ -n "$ASGI_WORKERS" ]; then
+    # Hot reads are routed here by nginx, the rest stays on sync workers.
+    gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker --workers "$ASGI_WORKERS" --bind 0.0.0.0:8001 &
+fi
 gunicorn backend.wsgi:application --bind 0.0.0.0:8000
 
 exec "$@"
\ No newline at end of file